@@ -0,0 +1,444 @@
+import collections
+import logging
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from synthesis import block_ramp, to_int16
+
+logger = logging.getLogger(__name__)
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.read_index = 0
+        self.write_index = 0
+        self.lock = threading.Lock()
+
+    def free(self):
+        with self.lock:
+            return self.capacity - (self.write_index - self.read_index)
+
+    def write(self, samples):
+        with self.lock:
+            count = min(len(samples), self.capacity - (self.write_index - self.read_index))
+            start = self.write_index % self.capacity
+            first = min(count, self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:count - first] = samples[first:count]
+            self.write_index += count
+        return count
+
+    def read(self, out):
+        with self.lock:
+            count = min(len(out), self.write_index - self.read_index)
+            start = self.read_index % self.capacity
+            first = min(count, self.capacity - start)
+            out[:first] = self.data[start:start + first]
+            out[first:count] = self.data[:count - first]
+            self.read_index += count
+        out[count:] = 0  # Pad with silence if the producers fall behind
+        return count
+
+class OutputMonitor:
+    # Keeps the last fft_size samples sent to the device. The device thread only copies into the
+    # history, the FFT runs on whichever thread calls analyze (the GUI, at its own frame rate)
+    def __init__(self, sample_rate, fft_size=4096, bands=64, min_frequency=50, window=256):
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.history = np.zeros(fft_size, dtype=np.int16)
+        self.write_index = 0
+        self.lock = threading.Lock()
+        self.samples = np.zeros(fft_size, dtype=np.float32)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Full-scale sine reads 0 dB whatever the window
+        self.scale = 2 / (32767 * np.sum(self.window))
+        freqs = np.fft.rfftfreq(fft_size, 1 / sample_rate)
+        edges = np.geomspace(min_frequency, sample_rate / 2, bands + 1)
+        # Log-spaced bands, merged where they are narrower than one bin at low frequencies
+        self.band_starts = np.unique(np.searchsorted(freqs, edges[:-1]))
+        self.band_frequencies = freqs[self.band_starts]
+        self.analysis_times = collections.deque(maxlen=window)
+
+    def write(self, samples):
+        samples = samples[-self.fft_size:]
+        with self.lock:
+            start = self.write_index % self.fft_size
+            first = min(len(samples), self.fft_size - start)
+            self.history[start:start + first] = samples[:first]
+            self.history[:len(samples) - first] = samples[first:]
+            self.write_index += len(samples)
+
+    def analyze(self):
+        started = time.perf_counter()
+        with self.lock:
+            start = self.write_index % self.fft_size
+            self.samples[:self.fft_size - start] = self.history[start:]
+            self.samples[self.fft_size - start:] = self.history[:start]
+        peak = np.max(np.abs(self.samples)) / 32767
+        rms = np.sqrt(np.mean(np.square(self.samples))) / 32767
+        self.samples *= self.window
+        magnitudes = np.abs(np.fft.rfft(self.samples)) * self.scale
+        # The loudest bin of each band, so a pure tone keeps its level however wide its band is
+        levels = np.maximum.reduceat(magnitudes, self.band_starts)
+        levels_db = 20 * np.log10(np.maximum(levels, 1e-6))
+        self.analysis_times.append(time.perf_counter() - started)
+        return levels_db, 20 * np.log10(max(peak, 1e-6)), 20 * np.log10(max(rms, 1e-6))
+
+    def analysis_ms(self):
+        return 1000 * float(np.mean(self.analysis_times)) if self.analysis_times else 0.0
+
+class PyAudioBackend:
+    def open(self, sample_rate, block_size, pull):
+        import pyaudio  # Loaded on first playback so headless users never need PortAudio
+        self.p = pyaudio.PyAudio()
+        try:
+            self.stream = self.p.open(format=pyaudio.paInt16,
+                                      channels=1,
+                                      rate=sample_rate,
+                                      output=True,
+                                      frames_per_buffer=block_size,
+                                      stream_callback=lambda in_data, frame_count, time_info, status: (pull(frame_count, bool(status & pyaudio.paOutputUnderflow)), pyaudio.paContinue))
+            self.stream.start_stream()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        # Also called after a failed open, so only tear down what was actually created
+        stream, self.stream = getattr(self, "stream", None), None
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+        p, self.p = getattr(self, "p", None), None
+        if p is not None:
+            p.terminate()
+
+class NullBackend:
+    # Stands in for the sound card: pulls blocks at the device rate and discards them
+    def open(self, sample_rate, block_size, pull):
+        self.frames_written = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, args=(sample_rate, block_size, pull), daemon=True)
+        self.thread.start()
+
+    def run(self, sample_rate, block_size, pull):
+        next_time = time.perf_counter()
+        while self.running:
+            self.consume(pull(block_size))
+            next_time += block_size / sample_rate
+            time.sleep(max(0, next_time - time.perf_counter()))
+
+    def consume(self, data):
+        self.frames_written += len(data) // 2
+
+    def close(self):
+        self.running = False
+        thread, self.thread = getattr(self, "thread", None), None
+        if thread is not None:
+            thread.join()
+
+class WaveFileBackend(NullBackend):
+    def __init__(self, path):
+        self.path = path
+
+    def open(self, sample_rate, block_size, pull):
+        self.wav = wave.open(self.path, "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(sample_rate)
+        try:
+            super().open(sample_rate, block_size, pull)
+        except Exception:
+            self.close()
+            raise
+
+    def consume(self, data):
+        super().consume(data)
+        self.wav.writeframes(data)
+
+    def close(self):
+        super().close()
+        wav, self.wav = getattr(self, "wav", None), None
+        if wav is not None:
+            wav.close()
+
+class PlaybackMetrics:
+    def __init__(self, window=4096):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.first_sample = None
+        self.blocks = 0
+        self.generation_time = 0.0
+        self.synthesis_cpu_time = 0.0
+        self.generation_times = collections.deque(maxlen=window)
+        self.block_latencies = collections.deque(maxlen=window)
+        self.underruns = 0
+
+    @property
+    def time_to_first_sample(self):
+        return None if self.first_sample is None else self.first_sample - self.started
+
+    def record_generation(self, seconds, cpu_seconds):
+        self.blocks += 1
+        self.generation_time += seconds
+        self.synthesis_cpu_time += cpu_seconds
+        self.generation_times.append(seconds)
+
+    def record_source_creation(self, seconds, cpu_seconds):
+        # Buffered sources do all their synthesis up front, before the first block is pulled
+        self.generation_time += seconds
+        self.synthesis_cpu_time += cpu_seconds
+
+    def summary(self):
+        # Block latency is the time from a block entering the ring to the device starting to play it
+        latencies = np.asarray(self.block_latencies) * 1000
+        generation = np.asarray(self.generation_times) * 1000
+        return {
+            "blocks": self.blocks,
+            "time_to_first_sample_ms": None if self.first_sample is None else self.time_to_first_sample * 1000,
+            "generation_ms": self.generation_time * 1000,
+            "synthesis_cpu_ms": self.synthesis_cpu_time * 1000,
+            "generation_p95_ms": float(np.percentile(generation, 95)) if len(generation) else None,
+            "underruns": self.underruns,
+            "block_latency_ms": {f"p{q}": float(np.percentile(latencies, q)) for q in (50, 95, 99)} if len(latencies) else None,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        first = summary["time_to_first_sample_ms"]
+        latency = summary["block_latency_ms"] or {"p50": 0, "p95": 0, "p99": 0}
+        return (f"{summary['blocks']} blocks, first sample after {first if first is not None else float('nan'):.1f} ms, "
+                f"synthesis {summary['generation_ms']:.1f} ms wall / {summary['synthesis_cpu_ms']:.1f} ms CPU, "
+                f"{summary['underruns']} underruns, "
+                f"block latency p50 {latency['p50']:.1f} / p95 {latency['p95']:.1f} / p99 {latency['p99']:.1f} ms")
+
+def log_playback_metrics(source, metrics):
+    logger.info("Playback of %s: %s", type(source).__name__, metrics)
+
+class Limiter:
+    # Looks one block ahead so a gain reduction has fully ramped in before the peak that needs it
+    def __init__(self, sample_rate, block_size, headroom_db=1.0, release_ms=200):
+        self.ceiling = 10 ** (-headroom_db / 20)
+        self.release = 1 - np.exp(-block_size / (sample_rate * release_ms / 1000))
+        self.gain = 1.0
+        self.delayed = np.zeros(block_size, dtype=np.float32)
+        self.delayed_peak = 0.0
+        self.gains = np.zeros(block_size, dtype=np.float32)
+        self.out = np.zeros(block_size, dtype=np.float32)
+
+    @property
+    def pending(self):
+        return self.delayed_peak > 0
+
+    def process(self, block):
+        peak = max(float(block.max()), -float(block.min()))
+        worst = max(peak, self.delayed_peak)
+        target = min(1.0, self.ceiling / worst) if worst > 0 else 1.0
+        if target > self.gain:
+            target = self.gain + (target - self.gain) * self.release
+
+        # Both ends of the ramp are safe for the delayed block, so every sample in between is too
+        if self.gain == target == 1.0:
+            self.out[:] = self.delayed
+        else:
+            np.multiply(block_ramp(len(block)), target - self.gain, out=self.gains)
+            self.gains += self.gain
+            np.multiply(self.delayed, self.gains, out=self.out)
+        self.gain = target
+        self.delayed[:] = block
+        self.delayed_peak = peak
+        return self.out
+
+class OutputEngine:
+    def __init__(self, sample_rate=44100, block_size=1024, latency=0.1, backend=None, on_session_end=None, headroom_db=1.0, monitor=None):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        buffer_blocks = max(2, int(np.ceil(latency * sample_rate / block_size)))
+        self.ring = RingBuffer(buffer_blocks * block_size)
+        self.backend = backend if backend is not None else PyAudioBackend()
+        self.on_session_end = on_session_end
+        self.monitor = monitor
+        self.limiter = Limiter(sample_rate, block_size, headroom_db)
+        self.sources = []
+        self.gains = {}
+        self.stopping = set()
+        self.sessions = {}
+        self.ending = []
+        self.pending_blocks = collections.deque()
+        self.limited_sessions = []
+        self.mix_block = np.zeros(block_size, dtype=np.float32)
+        self.gain_block = np.zeros(block_size, dtype=np.float32)
+        self.pcm_block = np.zeros(block_size, dtype=np.int16)
+        self.device_block = np.zeros(block_size, dtype=np.int16)
+        self.condition = threading.Condition()
+        self.start_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="output")
+        self.feeder = None
+        self.running = False
+
+    def start(self):
+        with self.start_lock:
+            if self.running:
+                return
+            # Open the device first, so a failure leaves the engine stopped and the next start retries.
+            # Until the feeder runs, the device just pulls silence from the empty ring
+            self.backend.open(self.sample_rate, self.block_size, self.pull)
+            self.running = True
+            self.feeder = threading.Thread(target=self.feed, daemon=True)
+            self.feeder.start()
+
+    def start_async(self):
+        return self.executor.submit(self.start)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.start_lock:
+            if not self.running:
+                return
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+            self.backend.close()
+            self.feeder.join()
+
+    def play(self, source, gain=1.0, metrics=None):
+        self.start()
+        with self.condition:
+            self.sessions[source] = metrics or PlaybackMetrics()
+            self.gains[source] = [gain, gain]
+            self.sources.append(source)
+            self.condition.notify_all()
+        return source
+
+    def play_async(self, create_source, gain=1.0):
+        # Synthesis and opening the device happen on a worker thread, so the caller never waits.
+        # The session clock starts now, so time to first sample includes the wait and the synthesis
+        metrics = PlaybackMetrics()
+
+        def create_and_play():
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            source = create_source()
+            metrics.record_source_creation(time.perf_counter() - started, time.thread_time() - cpu_started)
+            return self.play(source, gain, metrics)
+
+        return self.executor.submit(create_and_play)
+
+    def set_gain(self, source, gain):
+        with self.condition:
+            if source in self.gains:
+                self.gains[source][1] = gain
+
+    def stop(self, source):
+        with self.condition:
+            if source in self.sources:
+                self.stopping.add(source)
+                self.condition.notify_all()
+
+    def is_playing(self, source):
+        with self.condition:
+            return source in self.sources
+
+    def metrics(self, source):
+        with self.condition:
+            return self.sessions.get(source)
+
+    def pull(self, num_frames, device_underflow=False):
+        # Runs on the device thread, so it only copies out of the ring and never synthesizes
+        if len(self.device_block) != num_frames:
+            self.device_block = np.zeros(num_frames, dtype=np.int16)
+        out = self.device_block
+        count = self.ring.read(out)
+        if self.monitor is not None:
+            self.monitor.write(out)
+        now = time.perf_counter()
+
+        while self.pending_blocks and self.pending_blocks[0][0] < self.ring.read_index:
+            _, written_at, sessions = self.pending_blocks.popleft()
+            for metrics in sessions:
+                metrics.block_latencies.append(now - written_at)
+                if metrics.first_sample is None:
+                    metrics.first_sample = now
+
+        with self.condition:
+            if count < num_frames and self.sources or device_underflow:
+                for metrics in self.sessions.values():
+                    if metrics.first_sample is not None:
+                        metrics.underruns += 1
+            self.condition.notify_all()
+        # The backend copies the block before the next pull, so hand over a view instead of a copy
+        return memoryview(out).cast("B").toreadonly()
+
+    def drained_sessions(self):
+        return [entry for entry in self.ending if entry[0] <= self.ring.read_index]
+
+    def can_feed(self):
+        return (self.sources or self.limiter.pending) and self.ring.free() >= self.block_size
+
+    def add_to_mix(self, part, gain):
+        current, target = gain
+        if current == target == 1.0:
+            self.mix_block += part
+            return
+        if current == target:
+            np.multiply(part, target, out=self.gain_block)
+        else:
+            np.multiply(block_ramp(self.block_size), target - current, out=self.gain_block)
+            self.gain_block += current
+            self.gain_block *= part
+            gain[0] = target
+        self.mix_block += self.gain_block
+
+    def feed(self):
+        while True:
+            with self.condition:
+                while self.running and not self.drained_sessions() and not self.can_feed():
+                    self.condition.wait()
+                if not self.running:
+                    return
+                drained = self.drained_sessions()
+                self.ending = [entry for entry in self.ending if entry not in drained]
+                sources = list(self.sources)
+                stopping = self.stopping & set(sources)
+                sessions = [self.sessions[source] for source in sources]
+                gains = [self.gains[source] for source in sources]
+
+            # Sessions are reported once the device has played their last block
+            for _, source, metrics in drained:
+                metrics.finished = time.perf_counter()
+                if self.on_session_end is not None:
+                    self.on_session_end(source, metrics)
+            if not self.can_feed():
+                continue
+
+            self.mix_block.fill(0)
+            finished = []
+            for source, metrics, gain in zip(sources, sessions, gains):
+                started, cpu_started = time.perf_counter(), time.thread_time()
+                part = source.last_block() if source in stopping else source.next_block()
+                metrics.record_generation(time.perf_counter() - started, time.thread_time() - cpu_started)
+                if part is None or source in stopping:
+                    finished.append(source)
+                if part is not None:
+                    self.add_to_mix(part, gain)
+
+            # The limiter hands back the previous block, so that is what the ring receives now
+            block = self.limiter.process(self.mix_block)
+            start_index = self.ring.write_index
+            # can_feed guarantees room for a whole block, so the feeder waits rather than ever dropping samples
+            self.ring.write(to_int16(block, out=self.pcm_block))
+            self.pending_blocks.append((start_index, time.perf_counter(), self.limited_sessions))
+            self.limited_sessions = sessions
+
+            with self.condition:
+                # A source's last block is still held back by the limiter only if it carried audio,
+                # otherwise the block just written was its end and nothing more will be fed for it
+                end_index = self.ring.write_index + (self.block_size if self.limiter.pending else 0)
+                for source in finished:
+                    self.sources.remove(source)
+                    self.stopping.discard(source)
+                    del self.gains[source]
+                    self.ending.append((end_index, source, self.sessions.pop(source)))
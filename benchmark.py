@@ -0,0 +1,212 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import audio
+import synthesis
+
+DEFAULTS = {"duration_ms": 1000, "sample_rate": 44100, "tones": 1, "width": 0}
+SWEEP = {
+    "duration_ms": [25, 1000, 10000, 60000],
+    "sample_rate": [22050, 44100, 96000],
+    "tones": [1, 10, 50],
+    "width": [0, 50, 1000],
+}
+BLOCK_SIZE = 1024
+
+def tone_profile(tones, width):
+    freqs = list(np.geomspace(200, 12000, tones))
+    dominances = list(np.linspace(100, 20, tones))
+    widths = [width] * tones
+    return freqs, dominances, widths
+
+def bench_generate_fade(duration_ms, sample_rate, tones, width):
+    # Measure the computation itself rather than the memoized lookup
+    return lambda: synthesis.generate_fade.__wrapped__(duration_ms, sample_rate, fade_in=True), None
+
+def bench_generate_wave(duration_ms, sample_rate, tones, width):
+    return lambda: synthesis.generate_wave(1000, duration_ms, sample_rate, width), None
+
+def bench_white_noise(duration_ms, sample_rate, tones, width):
+    return lambda: synthesis.white_noise(int(sample_rate * duration_ms / 1000), seed=0), None
+
+def bench_normalize_signal(duration_ms, sample_rate, tones, width):
+    signal = np.random.normal(0, 1, int(sample_rate * duration_ms / 1000))
+    return lambda: synthesis.normalize_signal(signal), None
+
+def bench_generate_mixed_signal(duration_ms, sample_rate, tones, width):
+    freqs, dominances, widths = tone_profile(tones, width)
+    return lambda: synthesis.generate_mixed_signal(freqs, dominances, widths, duration_ms, sample_rate), None
+
+def bench_to_int16(duration_ms, sample_rate, tones, width):
+    signal = synthesis.generate_wave(1000, duration_ms, sample_rate)
+    return lambda: synthesis.to_int16(signal), None
+
+def bench_tone_stream(duration_ms, sample_rate, tones, width):
+    freqs, dominances, widths = tone_profile(tones, width)
+    num_blocks = -(-int(sample_rate * duration_ms / 1000) // BLOCK_SIZE)
+
+    def run():
+        tone_stream = synthesis.ToneStream(freqs, dominances, widths, sample_rate, BLOCK_SIZE)
+        for _ in range(num_blocks):
+            tone_stream.next_block()
+
+    def first_block():
+        synthesis.ToneStream(freqs, dominances, widths, sample_rate, BLOCK_SIZE).next_block()
+
+    return run, first_block
+
+def bench_masking_stream(duration_ms, sample_rate, tones, width):
+    num_blocks = -(-int(sample_rate * duration_ms / 1000) // BLOCK_SIZE)
+
+    def run():
+        masking_stream = synthesis.MaskingStream(sample_rate, "pink", 1000, block_size=BLOCK_SIZE)
+        for _ in range(num_blocks):
+            masking_stream.next_block()
+
+    def first_block():
+        synthesis.MaskingStream(sample_rate, "pink", 1000, block_size=BLOCK_SIZE).next_block()
+
+    return run, first_block
+
+def bench_playback(duration_ms, sample_rate, tones, width):
+    # The device side of playback without a device: int16 conversion, ring buffer write and pull
+    freqs, dominances, widths = tone_profile(tones, width)
+    num_blocks = -(-int(sample_rate * duration_ms / 1000) // BLOCK_SIZE)
+    engine = audio.OutputEngine(sample_rate, BLOCK_SIZE, backend=audio.NullBackend())
+    block = synthesis.ToneStream(freqs, dominances, widths, sample_rate, BLOCK_SIZE).next_block().copy()
+
+    def first_block():
+        engine.mix_block[:] = block
+        engine.ring.write(synthesis.to_int16(engine.mix_block, out=engine.pcm_block))
+        engine.pull(BLOCK_SIZE)
+
+    def run():
+        for _ in range(num_blocks):
+            first_block()
+
+    return run, first_block
+
+def bench_output_monitor(duration_ms, sample_rate, tones, width):
+    # One analyzer frame per 33 ms of audio, as drawn by the GUI, plus the device-side copies
+    monitor = audio.OutputMonitor(sample_rate)
+    block = synthesis.to_int16(synthesis.generate_wave(1000, BLOCK_SIZE / sample_rate * 1000, sample_rate))
+    num_blocks = -(-int(sample_rate * duration_ms / 1000) // BLOCK_SIZE)
+    num_frames = max(1, int(duration_ms / 33))
+
+    def run():
+        for _ in range(num_blocks):
+            monitor.write(block)
+        for _ in range(num_frames):
+            monitor.analyze()
+
+    return run, monitor.analyze
+
+BENCHMARKS = {
+    "generate_fade": (bench_generate_fade, ["duration_ms", "sample_rate"]),
+    "generate_wave": (bench_generate_wave, ["duration_ms", "sample_rate", "width"]),
+    "white_noise": (bench_white_noise, ["duration_ms", "sample_rate"]),
+    "normalize_signal": (bench_normalize_signal, ["duration_ms", "sample_rate"]),
+    "generate_mixed_signal": (bench_generate_mixed_signal, ["duration_ms", "sample_rate", "tones", "width"]),
+    "to_int16": (bench_to_int16, ["duration_ms", "sample_rate"]),
+    "tone_stream": (bench_tone_stream, ["duration_ms", "sample_rate", "tones", "width"]),
+    "masking_stream": (bench_masking_stream, ["duration_ms", "sample_rate"]),
+    "playback": (bench_playback, ["duration_ms", "sample_rate"]),
+    "output_monitor": (bench_output_monitor, ["duration_ms", "sample_rate"]),
+}
+
+def cases(names):
+    for name in names:
+        bench, dimensions = BENCHMARKS[name]
+        seen = set()
+        for dimension in dimensions:
+            for value in SWEEP[dimension]:
+                params = dict(DEFAULTS, **{dimension: value})
+                key = tuple(params[d] for d in dimensions)
+                if key not in seen:
+                    seen.add(key)
+                    label = ",".join(f"{d}={params[d]}" for d in dimensions)
+                    yield f"{name}[{label}]", bench, params
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_case(bench, params, repeat):
+    np.random.seed(0)
+    run, first_block = bench(**params)
+    run()  # Warm up caches and FFT plans
+
+    seconds = best_time(run, repeat)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Batch paths need the whole buffer before the first block can be played
+    first_block_seconds = best_time(first_block, repeat) if first_block else seconds
+    num_samples = int(params["sample_rate"] * params["duration_ms"] / 1000)
+    return {
+        "seconds": seconds,
+        "samples_per_second": num_samples / seconds if seconds > 0 else float("inf"),
+        "peak_memory_bytes": peak,
+        "first_block_seconds": first_block_seconds,
+    }
+
+def compare(results, baseline, tolerance, min_seconds):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["seconds"]
+        after = result["seconds"]
+        if after > before * (1 + tolerance) and after - before > min_seconds:
+            regressions.append(f"{key}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({after / before:.2f}x)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TinPop synthesis and playback paths without an audio device.")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the fastest one is reported (default: 5)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail when a case is slower than in this JSON results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this (default: 1 ms)")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    print(f"{'case':<80} {'time ms':>10} {'Msamples/s':>11} {'peak MB':>9} {'first ms':>9}")
+    for key, bench, params in cases(args.benchmarks or list(BENCHMARKS)):
+        result = run_case(bench, params, args.repeat)
+        results[key] = result
+        print(f"{key:<80} {result['seconds'] * 1000:>10.2f} {result['samples_per_second'] / 1e6:>11.1f} "
+              f"{result['peak_memory_bytes'] / 1e6:>9.2f} {result['first_block_seconds'] * 1000:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        if regressions:
+            print("\nSlower than baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,768 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from audio import OutputEngine, OutputMonitor, log_playback_metrics
+from matching import MatchingSession, log_matching_trace
+from profiles import PROFILE_RENDER_MS, ProfileStore, RenderCache
+from synthesis import NOISE_COLORS, BufferSource, MaskingStream, PcmSource, ToneStream, cached_mix, cached_wave, profile_params
+
+FRAME_MS = 16  # UI updates are drained at most once per frame (~60 fps)
+SPECTRUM_FRAME_MS = 33  # The analyzer redraws at most ~30 times per second
+SPECTRUM_CPU_SHARE = 0.1  # and slows down further if it would take more than this share of the UI thread
+SPECTRUM_FLOOR_DB = -80
+
+class TinnitusFrequencyGenerator(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("Tinnitus Frequency Generator")
+        self.geometry("700x800")
+        
+        self.frequency = tk.DoubleVar(value=1000)
+        self.sample_rate = 44100
+        self.duration_ms = 25
+        self.freq_width = tk.DoubleVar(value=0)
+        self.masking_color = tk.StringVar(value="pink")
+        self.notch_octaves = tk.DoubleVar(value=1.0)
+        self.notch_depth = tk.DoubleVar(value=40)
+        
+        self.freqs = []
+        self.freq_dom_sliders = []
+        self.freq_width_sliders = []
+        self.freq_width_entries = []
+        self.freq_width_labels = []
+
+        self.freq_width_error_shown = False
+        self.ui_updates = queue.SimpleQueue()
+        self.monitor = OutputMonitor(self.sample_rate)
+        self.output = OutputEngine(self.sample_rate, on_session_end=self.on_session_end, monitor=self.monitor)
+        # Open the device in the background so the first play is instant
+        self.output.start_async().add_done_callback(self.report_playback_error)
+        self.test_tone = None
+        self.test_tone_params = None
+        self.mixed_tone = None
+        self.masking_noise = None
+        # Futures of streams still being built on the output worker, until they start playing
+        self.test_tone_starting = None
+        self.mixed_tone_starting = None
+        self.masking_noise_starting = None
+        self.saved_mix = None
+        self.saved_mix_requested = False
+        self.matching = None
+        self.matching_trial = None
+        self.profiles = ProfileStore()
+        self.render_cache = RenderCache()
+        self.renderer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        # Matching candidates take milliseconds each, so they never queue behind a minutes-long profile render
+        self.prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        # Builds the noise generators of slider changes, so a drag never waits on a filter design
+        self.preparer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepare")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.canvas = tk.Canvas(self)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.scrollable_frame = tk.Frame(self.canvas)
+
+        self.scrollable_frame.bind(
+            "<Configure>",
+            lambda e: self.canvas.configure(
+                scrollregion=self.canvas.bbox("all")
+            )
+        )
+
+        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # Add bindings for scroll wheel events
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-4>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-5>", self._on_mousewheel)
+
+        self.create_widgets()
+        self.frequency.trace_add("write", lambda *args: self.post(self.refresh_test_tone, key="test_tone"))
+        self.frequency.trace_add("write", lambda *args: self.post(self.refresh_masking_noise, key="masking_noise"))
+        self.freq_width.trace_add("write", lambda *args: self.post(self.refresh_test_tone, key="test_tone"))
+        self.after(FRAME_MS, self.drain_ui_updates)
+        self.after(SPECTRUM_FRAME_MS, self.draw_spectrum)
+
+    def post(self, callback, key=None):
+        # Safe to call from any thread. Callbacks posted with the same key before the next frame
+        # collapse into the most recent one, so a burst of slider events costs one update
+        self.ui_updates.put((key, callback))
+
+    def drain_ui_updates(self):
+        updates = {}
+        try:
+            while True:
+                key, callback = self.ui_updates.get_nowait()
+                if key is None:
+                    key = object()
+                updates.pop(key, None)
+                updates[key] = callback
+        except queue.Empty:
+            pass
+
+        try:
+            for callback in updates.values():
+                callback()
+        finally:
+            self.after(FRAME_MS, self.drain_ui_updates)
+
+    def level_to_fraction(self, level_db):
+        return min(max(1 - level_db / SPECTRUM_FLOOR_DB, 0), 1)
+
+    def draw_spectrum(self):
+        delay = SPECTRUM_FRAME_MS
+        if self.show_spectrum.get():
+            started = time.perf_counter()
+            levels_db, peak_db, rms_db = self.monitor.analyze()
+            for bar, level_db in zip(self.spectrum_bars, levels_db):
+                x0, _, x1, y1 = self.spectrum_canvas.coords(bar)
+                self.spectrum_canvas.coords(bar, x0, y1 - self.level_to_fraction(level_db) * self.spectrum_height, x1, y1)
+            for bar, level_db in ((self.peak_bar, peak_db), (self.rms_bar, rms_db)):
+                _, y0, _, y1 = self.spectrum_canvas.coords(bar)
+                self.spectrum_canvas.coords(bar, 0, y0, self.level_to_fraction(level_db) * self.spectrum_width, y1)
+            frame_ms = (time.perf_counter() - started) * 1000
+            delay = max(SPECTRUM_FRAME_MS, int(frame_ms / SPECTRUM_CPU_SHARE))
+            self.spectrum_label.config(text=f"Peak {peak_db:.1f} dBFS, RMS {rms_db:.1f} dBFS. "
+                                            f"Analyzer {frame_ms:.2f} ms per frame (FFT {self.monitor.analysis_ms():.2f} ms), "
+                                            f"{100 * frame_ms / delay:.1f}% of the UI thread")
+        self.after(delay, self.draw_spectrum)
+
+    def on_session_end(self, source, metrics):
+        # Called on the audio feeder thread, so hand the UI work to the main loop
+        log_playback_metrics(source, metrics)
+        self.post(lambda: self.playback_ended(source))
+
+    def playback_ended(self, source):
+        if source is self.test_tone:
+            self.stop_test_tone()
+        elif source is self.mixed_tone:
+            self.stop_mixed_tone()
+        elif source is self.masking_noise:
+            self.stop_masking_noise()
+        elif source is self.saved_mix:
+            self.stop_saved_mix()
+
+    def report_playback_error(self, future):
+        # Runs on the output worker, so the message box is posted to the main loop
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            self.post(lambda: messagebox.showerror("Error", f"Playback failed: {error}"))
+
+    def play_async(self, create_source):
+        future = self.output.play_async(create_source)
+        future.add_done_callback(self.report_playback_error)
+        return future
+
+    def start_stream(self, create_source, started):
+        # Building a looped stream can render seconds of noise per voice and the first play waits for the
+        # device, so both happen on the output worker and started gets the future back on the main loop
+        future = self.play_async(create_source)
+        future.add_done_callback(lambda future: self.post(lambda: started(future)))
+        return future
+
+    def started_source(self, future, starting):
+        # The source of a finished start, or None if it failed or was stopped or restarted meanwhile
+        source = None if future.cancelled() or future.exception() is not None else future.result()
+        if future is not starting:
+            self.output.stop(source)
+            return None
+        return source
+
+    def on_close(self):
+        self.renderer.shutdown(wait=False, cancel_futures=True)
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.preparer.shutdown(wait=False, cancel_futures=True)
+        self.output.close()
+        self.destroy()
+
+    def _on_mousewheel(self, event):
+        if event.num == 5 or event.delta == -120:
+            self.canvas.yview_scroll(1, "units")
+        if event.num == 4 or event.delta == 120:
+            self.canvas.yview_scroll(-1, "units")
+
+    def create_widgets(self):
+        frame_output = tk.LabelFrame(self.scrollable_frame, text="Output", padx=10, pady=10)
+        frame_output.pack(padx=10, pady=10, fill="both", expand="yes")
+
+        self.show_spectrum = tk.BooleanVar(value=True)
+        tk.Checkbutton(frame_output, text="Show Spectrum", variable=self.show_spectrum).pack(pady=5)
+        self.spectrum_width, self.spectrum_height = 600, 140
+        self.spectrum_canvas = tk.Canvas(frame_output, width=self.spectrum_width, height=self.spectrum_height + 30, bg="black")
+        self.spectrum_canvas.pack(pady=5)
+        # Items are created once and only moved on every frame
+        bands = len(self.monitor.band_starts)
+        bar_width = self.spectrum_width / bands
+        self.spectrum_bars = [self.spectrum_canvas.create_rectangle(i * bar_width + 1, self.spectrum_height, (i + 1) * bar_width - 1,
+                                                                    self.spectrum_height, fill="lime green", width=0)
+                              for i in range(bands)]
+        self.peak_bar = self.spectrum_canvas.create_rectangle(0, self.spectrum_height + 8, 0, self.spectrum_height + 16, fill="orange", width=0)
+        self.rms_bar = self.spectrum_canvas.create_rectangle(0, self.spectrum_height + 20, 0, self.spectrum_height + 28, fill="yellow", width=0)
+        self.spectrum_label = tk.Label(frame_output, text="")
+        self.spectrum_label.pack(pady=5)
+
+        frame_freq_test = tk.LabelFrame(self.scrollable_frame, text="Frequency Test", padx=10, pady=10)
+        frame_freq_test.pack(padx=10, pady=10, fill="both", expand="yes")
+
+        tk.Label(frame_freq_test, text="Find Your Frequency (Hz)").pack(pady=5)
+        self.freq_slider = ttk.Scale(frame_freq_test, from_=100, to=20000, variable=self.frequency, length=600)
+        self.freq_slider.pack(pady=5)
+        self.freq_slider.bind("<B1-Motion>", lambda e: self.post(self.update_freq_label, key="freq_label"))
+        self.freq_slider.bind("<ButtonRelease-1>", lambda e: self.post(self.update_freq_label, key="freq_label"))
+        
+        self.freq_label = tk.Label(frame_freq_test, text="Current Frequency: 1000 Hz")
+        self.freq_label.pack(pady=5)
+
+        self.freq_entry_frame = tk.Frame(frame_freq_test)
+        self.freq_entry_frame.pack(pady=5)
+        
+        self.freq_entry = ttk.Entry(self.freq_entry_frame)
+        self.freq_entry.pack(side=tk.LEFT)
+        self.freq_entry.bind("<Return>", self.set_frequency_from_entry)
+        
+        tk.Label(self.freq_entry_frame, text="Enter Manually").pack(side=tk.LEFT, padx=5)
+
+        btn_frame = tk.Frame(frame_freq_test)
+        btn_frame.pack(pady=5)
+        tk.Button(btn_frame, text="Increase by 1 Octave", command=self.increase_octave).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Decrease by 1 Octave", command=self.decrease_octave).pack(side=tk.LEFT, padx=5)
+        
+        matching_frame = tk.Frame(frame_freq_test)
+        matching_frame.pack(pady=5)
+        self.matching_button = tk.Button(matching_frame, text="Start Automatic Matching", command=self.toggle_matching)
+        self.matching_button.pack(side=tk.LEFT, padx=5)
+        self.matching_answer_buttons = []
+        for text, choice in (("A Is Closer", "a"), ("B Is Closer", "b"), ("Same", "same")):
+            button = tk.Button(matching_frame, text=text, state=tk.DISABLED, command=lambda choice=choice: self.answer_matching(choice))
+            button.pack(side=tk.LEFT, padx=5)
+            self.matching_answer_buttons.append(button)
+        self.matching_replay_button = tk.Button(matching_frame, text="Replay", state=tk.DISABLED, command=self.play_matching_trial)
+        self.matching_replay_button.pack(side=tk.LEFT, padx=5)
+        self.matching_label = tk.Label(frame_freq_test, text="")
+        self.matching_label.pack(pady=5)
+
+        tk.Button(frame_freq_test, text="Play Short Sample", command=self.play_current_sample).pack(pady=5)
+
+        tk.Label(frame_freq_test, text="VOLUME WARNING").pack(pady=5)
+        self.constant_play_button = tk.Button(frame_freq_test, text="Play Constant Tone", command=lambda: self.toggle_constant_playback(self.frequency, self.freq_width))
+        self.constant_play_button.pack(pady=5)
+
+        tk.Label(frame_freq_test, text="Frequency Width").pack(pady=5)
+        self.freq_width_slider = ttk.Scale(frame_freq_test, from_=0, to=20000, variable=self.freq_width, length=600)
+        self.freq_width_slider.pack(pady=5)
+        
+        self.freq_width_label = tk.Label(frame_freq_test, text="Current Frequency Width: 0 Hz")
+        self.freq_width_label.pack(pady=5)
+        
+        self.freq_width_entry = ttk.Entry(frame_freq_test)
+        self.freq_width_entry.pack(pady=5)
+        self.freq_width_entry.bind("<Return>", self.set_freq_width_from_entry)
+        
+        tk.Label(frame_freq_test, text="INCREASING FREQUENCY WIDTH WILL MAKE THE TONE MORE HISS-LIKE. KEEP IT AT 0 FOR A PURE TONE.")
+        self.freq_width_slider.bind("<B1-Motion>", lambda e: self.post(self.update_freq_width_label_refresh, key="freq_width_label"))
+        self.freq_width_slider.bind("<ButtonRelease-1>", lambda e: self.post(self.update_freq_width_label_refresh, key="freq_width_label"))
+
+        frame_masking = tk.LabelFrame(self.scrollable_frame, text="Masking Noise", padx=10, pady=10)
+        frame_masking.pack(padx=10, pady=10, fill="both", expand="yes")
+
+        tk.Label(frame_masking, text="Noise with a notch at the frequency found above").pack(pady=5)
+        color_frame = tk.Frame(frame_masking)
+        color_frame.pack(pady=5)
+        for color in NOISE_COLORS:
+            tk.Radiobutton(color_frame, text=color.capitalize(), value=color, variable=self.masking_color,
+                           command=self.restart_masking_noise).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(frame_masking, text="Notch Width (octaves between the -3 dB edges)").pack(pady=5)
+        tk.Scale(frame_masking, from_=0.1, to=3, resolution=0.1, orient=tk.HORIZONTAL, length=600, variable=self.notch_octaves,
+                 command=lambda value: self.post(self.refresh_masking_noise, key="masking_noise")).pack(pady=5)
+        tk.Label(frame_masking, text="Notch Depth (dB)").pack(pady=5)
+        tk.Scale(frame_masking, from_=0, to=60, orient=tk.HORIZONTAL, length=600, variable=self.notch_depth,
+                 command=lambda value: self.post(self.refresh_masking_noise, key="masking_noise")).pack(pady=5)
+
+        tk.Label(frame_masking, text="VOLUME WARNING").pack(pady=5)
+        self.masking_play_button = tk.Button(frame_masking, text="Play Masking Noise", command=self.toggle_masking_noise)
+        self.masking_play_button.pack(pady=5)
+
+        frame_freq_gen = tk.LabelFrame(self.scrollable_frame, text="Frequency Generator", padx=10, pady=10)
+        frame_freq_gen.pack(padx=10, pady=10, fill="both", expand="yes")
+
+        tk.Label(frame_freq_gen, text="Frequencies (comma separated)").pack(pady=5)
+        self.tonal_entry = tk.Entry(frame_freq_gen)
+        self.tonal_entry.pack(pady=5)
+        
+        self.confirm_tones_button = tk.Button(frame_freq_gen, text="Confirm Tones", command=self.confirm_tones)
+        self.confirm_tones_button.pack(pady=5)
+        
+        tk.Button(frame_freq_gen, text="Play Short Sample", command=self.play_sample).pack(pady=5)
+
+        tk.Label(frame_freq_gen, text="VOLUME WARNING").pack(pady=5)
+        self.constant_play_button_gen = tk.Button(frame_freq_gen, text="Play Constant Tone", command=self.play_constant_tone_gen)
+        self.constant_play_button_gen.pack(pady=5)
+
+        profile_frame = tk.Frame(frame_freq_gen)
+        profile_frame.pack(pady=5)
+        tk.Label(profile_frame, text="Profile").pack(side=tk.LEFT, padx=5)
+        self.profile_name = ttk.Combobox(profile_frame, values=self.profiles.names())
+        self.profile_name.pack(side=tk.LEFT, padx=5)
+        tk.Button(profile_frame, text="Save Profile", command=self.save_profile).pack(side=tk.LEFT, padx=5)
+        tk.Button(profile_frame, text="Load Profile", command=self.load_profile).pack(side=tk.LEFT, padx=5)
+        self.saved_mix_button = tk.Button(frame_freq_gen, text="Play Saved Mix", command=self.toggle_saved_mix)
+        self.saved_mix_button.pack(pady=5)
+
+        self.frame_tone_dom = tk.LabelFrame(self.scrollable_frame, text="Tone Dominance", padx=10, pady=10)
+        self.frame_tone_dom.pack(padx=10, pady=10, fill="both", expand="yes")
+        self.frame_tone_dom.pack_forget()
+
+    def toggle_constant_playback(self, frequency, freq_width):
+        if self.test_tone_starting is None and not self.output.is_playing(self.test_tone):
+            self.constant_play_button.config(text="Stop Constant Tone")
+            self.play_constant_tone(frequency, freq_width)
+        else:
+            self.stop_test_tone()
+
+    def play_constant_tone_gen(self):
+        if not self.freqs:
+            messagebox.showerror("Error", "No frequencies confirmed. Please confirm tones first.")
+            return
+        if self.mixed_tone_starting is None and not self.output.is_playing(self.mixed_tone):
+            self.constant_play_button_gen.config(text="Stop Constant Tone")
+            self.play_constant_mixed_tone()
+        else:
+            self.stop_mixed_tone()
+
+    def stop_test_tone(self):
+        self.output.stop(self.test_tone)
+        self.test_tone = None
+        self.test_tone_starting = None
+        self.constant_play_button.config(text="Play Constant Tone")
+
+    def stop_mixed_tone(self):
+        self.output.stop(self.mixed_tone)
+        self.mixed_tone = None
+        self.mixed_tone_starting = None
+        self.constant_play_button_gen.config(text="Play Constant Tone")
+
+    def toggle_masking_noise(self):
+        if self.masking_noise_starting is None and not self.output.is_playing(self.masking_noise):
+            self.masking_play_button.config(text="Stop Masking Noise")
+            self.play_masking_noise()
+        else:
+            self.stop_masking_noise()
+
+    def stop_masking_noise(self):
+        self.output.stop(self.masking_noise)
+        self.masking_noise = None
+        self.masking_noise_starting = None
+        self.masking_play_button.config(text="Play Masking Noise")
+
+    def restart_masking_noise(self):
+        # The color decides the filter structure, so it needs a new stream rather than an update
+        if self.masking_noise_starting is not None or self.output.is_playing(self.masking_noise):
+            self.output.stop(self.masking_noise)
+            self.masking_noise = None
+            self.play_masking_noise()
+
+    def masking_noise_params(self):
+        return self.frequency.get(), self.notch_octaves.get(), self.notch_depth.get()
+
+    def play_masking_noise(self):
+        color, params, block_size = self.masking_color.get(), self.masking_noise_params(), self.output.block_size
+        self.masking_noise_starting = self.start_stream(
+            lambda: MaskingStream(self.sample_rate, color, *params, block_size=block_size), self.masking_noise_started)
+
+    def masking_noise_started(self, future):
+        source = self.started_source(future, self.masking_noise_starting)
+        if future is not self.masking_noise_starting:
+            return
+        self.masking_noise_starting = None
+        if source is None:
+            self.stop_masking_noise()
+        else:
+            self.masking_noise = source
+            self.refresh_masking_noise()  # Picks up slider changes made while it was starting
+
+    # Running tones pick up slider changes on their next block, with no re-render
+    def refresh_test_tone(self):
+        if self.output.is_playing(self.test_tone):
+            self.test_tone.update(*self.test_tone_params())
+
+    def refresh_mixed_tone(self):
+        if self.output.is_playing(self.mixed_tone):
+            self.mixed_tone.update(*self.mixed_tone_params())
+
+    def refresh_masking_noise(self):
+        if self.output.is_playing(self.masking_noise):
+            self.masking_noise.update(*self.masking_noise_params())
+
+    def mixed_tone_params(self):
+        dominances = [slider.get() for slider in self.freq_dom_sliders]
+        widths = [slider.get() for slider in self.freq_width_sliders]
+        return self.freqs, dominances, widths
+
+    def save_profile(self):
+        name = self.profile_name.get().strip()
+        if not name:
+            messagebox.showerror("Error", "Please enter a profile name.")
+            return
+        if not self.freqs:
+            messagebox.showerror("Error", "No frequencies confirmed. Please confirm tones first.")
+            return
+        params = self.mixed_tone_params()
+        self.profiles.save(name, *params)
+        self.profile_name.config(values=self.profiles.names())
+        # Render the long mix in the background so playing the saved profile later starts instantly
+        self.renderer.submit(self.render_cache.open, *params, PROFILE_RENDER_MS, self.sample_rate)
+
+    def load_profile(self):
+        profile = self.profiles.get(self.profile_name.get().strip())
+        if profile is None:
+            messagebox.showerror("Error", "No saved profile with this name.")
+            return
+        self.tonal_entry.delete(0, tk.END)
+        freqs, dominances, widths = profile_params(profile)
+        self.tonal_entry.insert(0, ", ".join(f"{freq:g}" for freq in freqs))
+        self.confirm_tones()
+        if not self.freqs:
+            return
+        for i, (dominance, width) in enumerate(zip(dominances, widths)):
+            self.freq_dom_sliders[i].set(dominance)
+            self.freq_width_sliders[i].set(width)
+            self.update_freq_width_label_individual(i)
+
+    def toggle_saved_mix(self):
+        if self.saved_mix_requested:
+            self.stop_saved_mix()
+            return
+        profile = self.profiles.get(self.profile_name.get().strip())
+        if profile is None:
+            messagebox.showerror("Error", "No saved profile with this name.")
+            return
+        self.saved_mix_requested = True
+        params = (*profile_params(profile), PROFILE_RENDER_MS, self.sample_rate)
+        if self.render_cache.contains(*params):
+            # A cached mix is only memory mapped, so it starts at once however long it is
+            self.saved_mix_button.config(text="Stop Saved Mix")
+            self.play_saved_mix(lambda: self.render_cache.open(*params))
+        else:
+            # Rendering takes seconds, so it runs on the render thread instead of holding up
+            # the output worker that every short sample and matching trial goes through
+            self.saved_mix_button.config(text="Stop Saved Mix (Rendering)")
+            rendered = self.renderer.submit(self.render_cache.open, *params)
+            rendered.add_done_callback(lambda rendered: self.post(lambda: self.saved_mix_rendered(rendered)))
+
+    def saved_mix_rendered(self, rendered):
+        if not self.saved_mix_requested:
+            return
+        if rendered.exception() is not None:
+            self.stop_saved_mix()
+            messagebox.showerror("Error", f"Rendering the saved mix failed: {rendered.exception()}")
+            return
+        self.saved_mix_button.config(text="Stop Saved Mix")
+        pcm = rendered.result()
+        self.play_saved_mix(lambda: pcm)
+
+    def play_saved_mix(self, open_pcm):
+        block_size = self.output.block_size
+        future = self.play_async(lambda: PcmSource(open_pcm(), block_size))
+        future.add_done_callback(lambda future: self.post(lambda: self.saved_mix_started(future)))
+
+    def saved_mix_started(self, future):
+        if future.exception() is not None:
+            self.stop_saved_mix()
+        elif not self.saved_mix_requested:
+            self.output.stop(future.result())  # Stopped again while the mix was starting
+        else:
+            self.saved_mix = future.result()
+
+    def stop_saved_mix(self):
+        self.output.stop(self.saved_mix)
+        self.saved_mix = None
+        self.saved_mix_requested = False
+        self.saved_mix_button.config(text="Play Saved Mix")
+
+    def play_constant_mixed_tone(self):
+        params, block_size = self.mixed_tone_params(), self.output.block_size
+        self.mixed_tone_starting = self.start_stream(
+            lambda: ToneStream(*params, self.sample_rate, block_size, looped=True, executor=self.preparer),
+            self.mixed_tone_started)
+
+    def mixed_tone_started(self, future):
+        source = self.started_source(future, self.mixed_tone_starting)
+        if future is not self.mixed_tone_starting:
+            return
+        self.mixed_tone_starting = None
+        if source is None:
+            self.stop_mixed_tone()
+        else:
+            self.mixed_tone = source
+            self.refresh_mixed_tone()  # Picks up slider changes made while it was starting
+
+    def play_constant_tone(self, frequency, freq_width):
+        def params():
+            freq = frequency.get() if isinstance(frequency, tk.DoubleVar) else frequency
+            width = freq_width.get() if isinstance(freq_width, tk.DoubleVar) else freq_width
+            return [freq], [100], [width]
+
+        initial, block_size = params(), self.output.block_size
+        self.test_tone_params = params
+        self.test_tone_starting = self.start_stream(
+            lambda: ToneStream(*initial, self.sample_rate, block_size, looped=True, executor=self.preparer),
+            self.test_tone_started)
+
+    def test_tone_started(self, future):
+        source = self.started_source(future, self.test_tone_starting)
+        if future is not self.test_tone_starting:
+            return
+        self.test_tone_starting = None
+        if source is None:
+            self.stop_test_tone()
+        else:
+            self.test_tone = source
+            self.refresh_test_tone()  # Picks up slider changes made while it was starting
+
+    def increase_octave(self):
+        new_freq = self.frequency.get() * 2
+        if new_freq > 20000:
+            messagebox.showerror("Error", "Frequency cannot exceed 20000 Hz.")
+        else:
+            self.frequency.set(new_freq)
+            self.update_freq_label(None)
+    
+    def decrease_octave(self):
+        new_freq = self.frequency.get() / 2
+        if new_freq < 100:
+            messagebox.showerror("Error", "Frequency cannot be lower than 100 Hz.")
+        else:
+            self.frequency.set(new_freq)
+            self.update_freq_label(None)
+        
+    def toggle_matching(self):
+        if self.matching is not None:
+            self.finish_matching()
+            return
+        # Candidates are pre-rendered on their own threads while the current trial plays
+        self.matching = MatchingSession(self.frequency.get(), self.sample_rate, self.freq_width.get(), executor=self.prefetcher)
+        self.matching_button.config(text="Stop Matching")
+        for button in self.matching_answer_buttons + [self.matching_replay_button]:
+            button.config(state=tk.NORMAL)
+        self.play_matching_trial()
+
+    def play_matching_trial(self):
+        self.stop_matching_trial()
+        trial = self.matching.present()
+        a, b = trial
+        self.matching_label.config(text=f"Which tone is closer to your tinnitus? A ({a:g} Hz) plays first, then B ({b:g} Hz).")
+        matching = self.matching
+        block_size = self.output.block_size
+        future = self.play_async(lambda: matching.source(trial, block_size))
+        future.add_done_callback(lambda future: self.post(lambda: self.matching_trial_started(future)))
+        self.matching_trial = future
+
+    def matching_trial_started(self, future):
+        # Answering before a trial has finished cuts it off rather than playing over the next one,
+        # including trials that were still being prepared when the answer came in
+        if future is not self.matching_trial and not future.cancelled() and future.exception() is None:
+            self.output.stop(future.result())
+
+    def stop_matching_trial(self):
+        future, self.matching_trial = self.matching_trial, None
+        if future is not None and future.done() and not future.cancelled() and future.exception() is None:
+            self.output.stop(future.result())
+
+    def answer_matching(self, choice):
+        self.matching.answer(choice)
+        if self.matching.done:
+            self.frequency.set(self.matching.result)
+            self.update_freq_label()
+            self.finish_matching()
+        else:
+            self.play_matching_trial()
+
+    def finish_matching(self):
+        self.stop_matching_trial()
+        log_matching_trace(self.matching)
+        result = self.matching.result
+        self.matching_label.config(text=f"Matched frequency: {int(result)} Hz" if result is not None else "")
+        self.matching = None
+        self.matching_button.config(text="Start Automatic Matching")
+        for button in self.matching_answer_buttons + [self.matching_replay_button]:
+            button.config(state=tk.DISABLED)
+
+    def update_freq_label(self, event=None):
+        self.freq_label.config(text=f"Current Frequency: {int(self.frequency.get())} Hz")
+        self.freq_entry.delete(0, tk.END)
+        self.freq_entry.insert(0, str(int(self.frequency.get())))
+        self.check_frequency_width_range()
+
+    def set_frequency_from_entry(self, event):
+        try:
+            new_freq = float(self.freq_entry.get())
+            if new_freq < 100 or new_freq > 20000:
+                messagebox.showerror("Error", "Frequency must be between 100 Hz and 20000 Hz.")
+            else:
+                self.frequency.set(new_freq)
+                self.update_freq_label(None)
+                self.check_frequency_width_range()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid frequency.")
+    
+    def update_freq_width_label_refresh(self, event=None):
+        self.update_freq_width_label()
+    
+    def update_freq_width_label(self, event=None):
+        self.freq_width_label.config(text=f"Current Frequency Width: {int(self.freq_width.get())} Hz")
+        self.freq_width_entry.delete(0, tk.END)
+        self.freq_width_entry.insert(0, str(int(self.freq_width.get())))
+        self.check_frequency_width_range()
+    
+    def set_freq_width_from_entry(self, event):
+        try:
+            new_width = float(self.freq_width_entry.get())
+            freq = self.frequency.get()
+            max_width = min(freq - 100, 20000 - freq)
+            if new_width > max_width:
+                new_width = max_width
+            
+            self.freq_width.set(new_width)
+            self.freq_width_slider.set(new_width)
+            self.freq_width_label.config(text=f"Current Frequency Width: {int(self.freq_width.get())} Hz")
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid frequency width.")
+    
+    def check_frequency_width_range(self):
+        freq = self.frequency.get()
+        width = self.freq_width.get()
+        max_width = min(freq - 100, 20000 - freq)
+        if width > max_width:
+            self.freq_width.set(max_width)
+            self.freq_width_slider.set(max_width)
+            self.freq_width_entry.delete(0, tk.END)
+            self.freq_width_entry.insert(0, str(int(max_width)))
+            self.freq_width_label.config(text=f"Current Frequency Width: {int(max_width)} Hz")
+        else:
+            self.freq_width_label.config(text=f"Current Frequency Width: {int(width)} Hz")
+
+    def parse_frequencies(self, freq_string):
+        freqs = [float(freq.strip()) for freq in freq_string.split(',') if freq.strip()]
+        for freq in freqs:
+            if freq < 100 or freq > 20000:
+                messagebox.showerror("Error", "Frequencies must be between 100 Hz and 20000 Hz.")
+                return []
+        return freqs
+
+    def play_current_sample(self):
+        freq = self.frequency.get()
+        freq_width = self.freq_width.get()
+        
+        block_size = self.output.block_size
+        self.play_async(lambda: BufferSource(cached_wave(freq, self.duration_ms, self.sample_rate, freq_width), block_size))
+
+    def play_sample(self):
+        if not self.freqs:
+            messagebox.showerror("Error", "No frequencies confirmed. Please confirm tones first.")
+            return
+        dominances = [slider.get() for slider in self.freq_dom_sliders]
+        widths = [slider.get() for slider in self.freq_width_sliders]
+        freqs = list(self.freqs)
+        block_size = self.output.block_size
+        self.play_async(lambda: BufferSource(cached_mix(freqs, dominances, widths, self.duration_ms, self.sample_rate), block_size))
+    
+    def confirm_tones(self):
+        if self.mixed_tone_starting is not None or self.output.is_playing(self.mixed_tone):
+            self.stop_mixed_tone()
+        self.freqs = self.parse_frequencies(self.tonal_entry.get())
+        
+        if not self.freqs:
+            return
+        
+        self.freq_dom_sliders = []
+        self.freq_width_sliders = []
+        self.freq_width_entries = []
+        self.freq_width_labels = []
+
+        total_sliders = len(self.freqs)
+        new_height = 800 + (total_sliders * 100)
+
+        self.geometry(f"850x{new_height}")
+        
+        for widget in self.frame_tone_dom.winfo_children():
+            widget.destroy()
+
+        tk.Label(self.frame_tone_dom, text="Adjust Tone Dominance (Volume) and Width").pack(pady=5)
+
+        for i, freq in enumerate(self.freqs):
+            frame = tk.LabelFrame(self.frame_tone_dom, text=f"Frequency {freq} Hz")
+            frame.pack(padx=10, pady=5, fill='x')
+
+            tk.Label(frame, text="Dominance:").pack(side=tk.LEFT, padx=5)
+            slider = tk.Scale(frame, from_=0, to=100, orient=tk.HORIZONTAL, command=lambda value: self.post(self.refresh_mixed_tone, key="mixed_tone"))
+            slider.set(100)
+            slider.pack(side=tk.LEFT, fill='x', expand=True)
+            percentage_label = tk.Label(frame, text="100%")
+            percentage_label.pack(side=tk.LEFT, padx=5)
+            slider.bind("<Motion>", lambda e, i=i, l=percentage_label, s=slider: self.post(lambda: l.config(text=f"{s.get()}%"), key=("dominance_label", i)))
+            self.freq_dom_sliders.append(slider)
+            
+            width_frame = tk.Frame(frame)
+            width_frame.pack(padx=10, pady=5, fill='x')
+            tk.Label(width_frame, text=f"Width for {freq} Hz:").pack(side=tk.LEFT, padx=5)
+            width_slider = tk.Scale(width_frame, from_=0, to=20000, orient=tk.HORIZONTAL, command=lambda value: self.post(self.refresh_mixed_tone, key="mixed_tone"))
+            width_slider.set(0)
+            width_slider.pack(side=tk.LEFT, fill='x', expand=True)
+            width_slider.bind("<B1-Motion>", lambda e, i=i: self.post(lambda: self.update_freq_width_label_individual(i), key=("width", i)))
+            width_slider.bind("<ButtonRelease-1>", lambda e, i=i: self.post(lambda: self.update_freq_width_label_individual(i), key=("width", i)))
+
+            width_percentage_label = tk.Label(width_frame, text="0 Hz")
+            width_percentage_label.pack(side=tk.LEFT, padx=5)
+            width_slider.bind("<Motion>", lambda e, i=i, l=width_percentage_label, s=width_slider: self.post(lambda: l.config(text=f"{s.get()} Hz"), key=("width_label", i)))
+            self.freq_width_sliders.append(width_slider)
+
+            width_entry = ttk.Entry(width_frame)
+            width_entry.pack(padx=5, pady=5)
+            width_entry.bind("<Return>", lambda event, i=i: self.set_freq_width_from_entry_individual(event, i))
+            self.freq_width_entries.append(width_entry)
+            
+            width_label = tk.Label(width_frame, text=f"Current Frequency Width: 0 Hz")
+            width_label.pack(pady=5)
+            self.freq_width_labels.append(width_label)
+        
+        self.frame_tone_dom.pack(padx=10, pady=10, fill="both", expand="yes")
+
+    def set_freq_width_from_entry_individual(self, event, index):
+        try:
+            new_width = float(self.freq_width_entries[index].get())
+            freq = self.freqs[index]
+            max_width = min(freq - 100, 20000 - freq)
+            if new_width > max_width:
+                new_width = max_width
+            
+            self.freq_width_sliders[index].set(new_width)
+            self.freq_width_labels[index].config(text=f"Current Frequency Width: {int(new_width)} Hz")
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid frequency width.")
+
+    def update_freq_width_label_individual(self, index):
+        current_width = int(self.freq_width_sliders[index].get())
+        self.freq_width_labels[index].config(text=f"Current Frequency Width: {current_width} Hz")
+        self.freq_width_entries[index].delete(0, tk.END)
+        self.freq_width_entries[index].insert(0, str(current_width))
+        self.check_frequency_width_range_for_individual(index)
+
+    def check_frequency_width_range_for_individual(self, index):
+        freq = self.freqs[index]
+        width = int(self.freq_width_sliders[index].get())
+        max_width = min(freq - 100, 20000 - freq)
+        if width > max_width:
+            self.freq_width_sliders[index].set(max_width)
+            self.freq_width_entries[index].delete(0, tk.END)
+            self.freq_width_entries[index].insert(0, str(max_width))
+            self.freq_width_labels[index].config(text=f"Current Frequency Width: {int(max_width)} Hz")
+        else:
+            self.freq_width_labels[index].config(text=f"Current Frequency Width: {int(width)} Hz")
@@ -0,0 +1,182 @@
+import time
+import logging
+import threading
+import collections
+import numpy as np
+
+from synthesis import BufferSource, cached_wave
+
+logger = logging.getLogger(__name__)
+
+CHOICES = ("a", "b", "same")
+MatchState = collections.namedtuple("MatchState", "phase current direction low high")
+
+class MatchingProcedure:
+    # Each trial plays tone A then tone B and asks which one is closer. The octave phase steps by whole
+    # octaves until neither neighbour is preferred, which catches octave confusion; bisection then halves
+    # the remaining octave in log frequency on every answer. The transitions are pure, so every trial that
+    # can follow the current one is known in advance
+    def __init__(self, low=100, high=20000, resolution_octaves=1 / 12):
+        self.low = low
+        self.high = high
+        self.resolution_octaves = resolution_octaves
+
+    def start(self, frequency):
+        return self.settle(MatchState("octave", min(max(frequency, self.low), self.high), None, None, None))
+
+    def settle(self, state):
+        # Move on from states that have no trial left to present
+        if state.phase == "octave":
+            if state.direction in (None, "up") and state.current * 2 <= self.high:
+                return state
+            if state.direction in (None, "down") and state.current / 2 >= self.low:
+                return state._replace(direction="down")
+            # Search half an octave either side, or up to a limit if the octave beyond it could not be offered
+            low = self.low if state.current / 2 < self.low else state.current / np.sqrt(2)
+            high = self.high if state.current * 2 > self.high else state.current * np.sqrt(2)
+            return self.settle(state._replace(phase="bisect", low=low, high=high))
+        if state.phase == "bisect" and np.log2(state.high / state.low) <= self.resolution_octaves:
+            return state._replace(phase="done", current=float(np.sqrt(state.low * state.high)))
+        return state
+
+    def trial(self, state):
+        if state.phase == "octave":
+            other = state.current / 2 if state.direction == "down" else state.current * 2
+            return round(state.current, 1), round(other, 1)
+        if state.phase == "bisect":
+            ratio = state.high / state.low
+            return round(state.low * ratio ** 0.25, 1), round(state.low * ratio ** 0.75, 1)
+        return None
+
+    def advance(self, state, choice):
+        if choice not in CHOICES:
+            raise ValueError(f"Unknown answer {choice!r}, expected one of {', '.join(CHOICES)}.")
+        if state.phase == "octave":
+            if choice == "b":
+                other = state.current / 2 if state.direction == "down" else state.current * 2
+                return self.settle(state._replace(current=other, direction="down" if state.direction == "down" else "up"))
+            if state.direction is None:
+                # Not higher, so check an octave lower before settling on this octave
+                return self.settle(state._replace(direction="down") if state.current / 2 >= self.low else
+                                   state._replace(direction="done"))
+            return self.settle(state._replace(direction="done"))
+        if state.phase == "bisect":
+            middle = np.sqrt(state.low * state.high)
+            if choice == "a":
+                return self.settle(state._replace(high=middle))
+            if choice == "b":
+                return self.settle(state._replace(low=middle))
+            ratio = state.high / state.low
+            return self.settle(state._replace(low=state.low * ratio ** 0.25, high=state.low * ratio ** 0.75))
+        return state
+
+class MatchingSession:
+    def __init__(self, start_frequency, sample_rate, freq_width=0, duration_ms=1000, gap_ms=300,
+                 procedure=None, executor=None):
+        self.procedure = procedure or MatchingProcedure()
+        self.state = self.procedure.start(start_frequency)
+        self.sample_rate = sample_rate
+        self.freq_width = freq_width
+        self.duration_ms = duration_ms
+        self.gap = np.zeros(int(sample_rate * gap_ms / 1000), dtype=np.float32)
+        self.executor = executor
+        self.prefetched = {}
+        self.trace = []
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.prefetch(self.trial)
+
+    @property
+    def trial(self):
+        return self.procedure.trial(self.state)
+
+    @property
+    def done(self):
+        return self.state.phase == "done"
+
+    @property
+    def result(self):
+        return self.state.current if self.done else None
+
+    def render(self, frequency):
+        width = max(0, min(self.freq_width, frequency - self.procedure.low, self.procedure.high - frequency))
+        return cached_wave(frequency, self.duration_ms, self.sample_rate, width)
+
+    def next_trials(self):
+        trials = [self.procedure.trial(self.procedure.advance(self.state, choice)) for choice in CHOICES]
+        return [trial for trial in dict.fromkeys(trials) if trial is not None]
+
+    def prefetch(self, *trials):
+        # Render every tone the next answer can lead to while the user is still listening
+        if self.executor is None:
+            return
+        for trial in trials:
+            for frequency in trial or ():
+                if frequency not in self.prefetched:
+                    self.prefetched[frequency] = self.executor.submit(self.render, frequency)
+
+    def present(self):
+        # Called on the thread that answers. source() then renders exactly this trial, even if an answer
+        # changes the state before the output worker gets to it
+        self.prefetch(*self.next_trials())
+        return self.trial
+
+    def source(self, trial, block_size=1024):
+        if trial is None:
+            return None
+        prefetched = all(frequency in self.prefetched and self.prefetched[frequency].done() for frequency in trial)
+        start = time.perf_counter()
+        wave_a, wave_b = (self.render(frequency) for frequency in trial)
+        signal = np.concatenate((wave_a, self.gap, wave_b))
+        presented_at = time.perf_counter()
+        with self.lock:
+            self.trace.append({
+                "phase": None,  # Filled in by answer, which owns the state
+                "freqs": trial,
+                "prefetched": prefetched,
+                "render_ms": (presented_at - start) * 1000,
+                "presented_at": presented_at - self.started_at,
+                "choice": None,
+                "response_ms": None,
+            })
+        return BufferSource(signal, block_size)
+
+    def answer(self, choice):
+        answered_at = time.perf_counter()
+        with self.lock:
+            if self.trace and self.trace[-1]["freqs"] == self.trial and self.trace[-1]["choice"] is None:
+                entry = self.trace[-1]
+                entry["phase"] = self.state.phase
+                entry["choice"] = choice
+                entry["response_ms"] = (answered_at - self.started_at - entry["presented_at"]) * 1000
+        self.state = self.procedure.advance(self.state, choice)
+        self.prefetch(self.trial)
+        return self.state
+
+    def summary(self):
+        with self.lock:
+            trace = list(self.trace)
+        render = np.asarray([entry["render_ms"] for entry in trace])
+        response = np.asarray([entry["response_ms"] for entry in trace if entry["response_ms"] is not None])
+        return {
+            "trials": len(trace),
+            "result_hz": self.result,
+            "session_s": time.perf_counter() - self.started_at,
+            "prefetch_hits": sum(entry["prefetched"] for entry in trace),
+            "render_max_ms": float(render.max()) if len(render) else None,
+            "response_median_ms": float(np.median(response)) if len(response) else None,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        result = summary["result_hz"]
+        return (f"{summary['trials']} trials in {summary['session_s']:.1f} s, "
+                f"result {result if result is not None else float('nan'):.1f} Hz, "
+                f"{summary['prefetch_hits']}/{summary['trials']} prefetched, "
+                f"render at play max {summary['render_max_ms'] or 0:.2f} ms, "
+                f"median response {summary['response_median_ms'] or 0:.0f} ms")
+
+def log_matching_trace(session):
+    logger.info("Pitch matching: %s", session)
+    for entry in session.trace:
+        logger.debug("Trial %s", entry)
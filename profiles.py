@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from synthesis import render_to_npy
+
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".tinpop")
+PROFILE_RENDER_MS = 5 * 60 * 1000
+RENDER_CACHE_BYTES = 1024 * 1024 * 1024
+
+def write_atomic(path, write):
+    # Write next to the target and rename, so a crash never leaves a half-written file behind
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class ProfileStore:
+    # Same format as the profiles file of `TinPop.py batch`: a JSON list of {"name", "freqs", "dominances", "widths"}
+    def __init__(self, path=os.path.join(PROFILE_DIR, "profiles.json")):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def names(self):
+        return [profile["name"] for profile in self.load()]
+
+    def get(self, name):
+        for profile in self.load():
+            if profile["name"] == name:
+                return profile
+        return None
+
+    def save(self, name, freqs, dominances, widths):
+        profile = {"name": name, "freqs": list(freqs), "dominances": list(dominances), "widths": list(widths)}
+        profiles = [existing for existing in self.load() if existing["name"] != name]
+        profiles.append(profile)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(profiles, f, indent=2)
+
+        write_atomic(self.path, write)
+        return profile
+
+class RenderCache:
+    def __init__(self, directory=os.path.join(PROFILE_DIR, "renders"), max_bytes=RENDER_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()  # Guards path_locks and eviction, never held during a render
+        self.path_locks = {}
+
+    def path(self, freqs, dominances, widths, duration_ms, sample_rate):
+        params = [[float(value) for value in values] for values in (freqs, dominances, widths)]
+        params += [float(duration_ms), int(sample_rate)]
+        key = hashlib.sha256(json.dumps(params).encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def contains(self, freqs, dominances, widths, duration_ms, sample_rate):
+        return os.path.exists(self.path(freqs, dominances, widths, duration_ms, sample_rate))
+
+    def path_lock(self, path):
+        with self.lock:
+            return self.path_locks.setdefault(path, threading.Lock())
+
+    def open(self, freqs, dominances, widths, duration_ms, sample_rate):
+        path = self.path(freqs, dominances, widths, duration_ms, sample_rate)
+        # Renders of the same parameters wait for each other, renders of different ones run side by side
+        with self.path_lock(path):
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                write_atomic(path, lambda temp_path: render_to_npy(temp_path, freqs, dominances, widths, duration_ms, sample_rate))
+            # The modification time doubles as the last use, so the order survives restarts
+            os.utime(path)
+            pcm = np.load(path, mmap_mode="r")
+        with self.lock:
+            self.evict(keep=path)
+        return pcm
+
+    def evict(self, keep):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            if path == keep or self.path_locks.get(path, threading.Lock()).locked():
+                continue  # Just opened, or being rendered or opened right now
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Still mapped by a running playback on platforms that lock mapped files
+            size -= entry_size
@@ -0,0 +1,748 @@
+import os
+import abc
+import functools
+import collections
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+
+NOISE_RMS = 0.2  # Matches the level of a long peak-normalized noise band
+NOISE_BLOCK = 65536  # Samples per random substream
+
+@functools.lru_cache(maxsize=16)
+def generate_fade(duration_ms, sample_rate, fade_in=True):
+    fade_length = int(sample_rate * (duration_ms / 1000.0))
+    if fade_in:
+        fade = 1 - np.exp(-5 * np.linspace(0, 1, fade_length))  # Fade-in starts slow and gradually increases
+    else:
+        fade = 1 - np.exp(-5 * np.linspace(1, 0, fade_length))  # Fade-out starts strong and gradually decreases
+    fade.flags.writeable = False  # Shared between callers through the cache
+    return fade
+
+def generate_wave(frequency, duration_ms, sample_rate, freq_width=0, seed=None):
+    t = np.linspace(0, duration_ms / 1000.0, int(sample_rate * (duration_ms / 1000.0)), endpoint=False)
+    
+    if freq_width == 0:
+        signal = np.sin(2 * np.pi * frequency * t)
+    else:
+        signal = band_noise(frequency, freq_width, len(t), sample_rate, seed)
+
+    # Apply fade-in and fade-out to smooth the beginning and ending
+    fade_in = generate_fade(1, sample_rate, fade_in=True)
+    fade_out = generate_fade(1, sample_rate, fade_in=False)
+    signal[:len(fade_in)] *= fade_in
+    signal[-len(fade_out):] *= fade_out
+
+    return normalize_signal(signal)
+
+def noise_seed(seed=None):
+    # None draws fresh entropy from the OS, so unseeded noise still differs on every call and in every process
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+class NoiseStream:
+    # Standard normal float32 noise where block b of NOISE_BLOCK samples comes from its own generator,
+    # seeded by (seed, b). Any range of the stream can be produced on its own, in any order or process,
+    # and is bit-identical to reading the whole stream from the start
+    def __init__(self, seed=None, position=0):
+        self.seed = noise_seed(seed)
+        self.block_index = position // NOISE_BLOCK
+        self.generator = self.block_generator(self.block_index)
+        self.generator.standard_normal(position % NOISE_BLOCK, dtype=np.float32)
+        self.remaining = NOISE_BLOCK - position % NOISE_BLOCK
+
+    def block_generator(self, index):
+        seed = np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + (index,))
+        return np.random.Generator(np.random.PCG64(seed))
+
+    def read(self, out):
+        filled = 0
+        while filled < len(out):
+            if self.remaining == 0:
+                self.block_index += 1
+                self.generator = self.block_generator(self.block_index)
+                self.remaining = NOISE_BLOCK
+            count = min(len(out) - filled, self.remaining)
+            self.generator.standard_normal(dtype=np.float32, out=out[filled:filled + count])
+            filled += count
+            self.remaining -= count
+        return out
+
+noise_executor = None
+noise_executor_lock = threading.Lock()
+
+def get_noise_executor():
+    # The render thread and the output worker can both generate their first long noise at once
+    global noise_executor
+    with noise_executor_lock:
+        if noise_executor is None:
+            noise_executor = ThreadPoolExecutor(thread_name_prefix="noise")
+        return noise_executor
+
+def white_noise(num_samples, seed=None, start=0):
+    out = np.empty(num_samples, dtype=np.float32)
+    seed = noise_seed(seed)
+    if num_samples < 4 * NOISE_BLOCK:
+        return NoiseStream(seed, start).read(out)
+
+    # Long stretches are filled one substream per task; the generators release the GIL while filling
+    bounds = [0] + list(range(-start % NOISE_BLOCK or NOISE_BLOCK, num_samples, NOISE_BLOCK))
+    chunks = zip(bounds, bounds[1:] + [num_samples])
+    list(get_noise_executor().map(lambda chunk: NoiseStream(seed, start + chunk[0]).read(out[chunk[0]:chunk[1]]), chunks))
+    return out
+
+def band_noise(frequency, freq_width, num_samples, sample_rate, seed=None):
+    # Create white noise and apply a bandpass filter centered around the desired frequency
+    noise = white_noise(num_samples, seed)
+    freqs = np.fft.rfftfreq(num_samples, 1 / sample_rate)
+    fft_filtered = np.fft.rfft(noise) * gaussian_band(freqs, frequency, freq_width)
+    return np.fft.irfft(fft_filtered, num_samples)
+
+def gaussian_band(freqs, frequency, freq_width):
+    band = np.exp(-0.5 * ((freqs - frequency) / (freq_width / 2)) ** 2)
+    band += np.exp(-0.5 * ((freqs + frequency) / (freq_width / 2)) ** 2)  # Mirror for negative frequencies
+    return band
+
+def generate_tone_bank(freqs, gains, num_samples, sample_rate, block_size=1024):
+    # Every block is the same phasor table rotated by each tone's phase at the block start,
+    # so the whole bank collapses into one (blocks x tones) @ (tones x block_size) product
+    omegas = 2 * np.pi * np.asarray(freqs, dtype=float) / sample_rate
+    num_blocks = -(-num_samples // block_size)
+    table = np.exp(1j * np.outer(omegas, np.arange(block_size)))
+    starts = np.asarray(gains, dtype=float) * np.exp(1j * np.outer(np.arange(num_blocks) * block_size, omegas))
+    return (starts @ table).imag.ravel()[:num_samples]
+
+def generate_noise_bank(freqs, gains, widths, num_samples, sample_rate, seed=None):
+    # Independent noise bands add in power, so a single random spectrum shaped by the
+    # summed band powers has the same statistics as summing separately filtered bands
+    spectrum_freqs = np.fft.rfftfreq(num_samples, 1 / sample_rate)
+    power = np.zeros(len(spectrum_freqs))
+    for freq, gain, width in zip(freqs, gains, widths):
+        lo, hi = np.searchsorted(spectrum_freqs, [freq - 3 * width, freq + 3 * width])
+        band = gaussian_band(spectrum_freqs[lo:hi], freq, width)
+        band_rms = np.sqrt(2 * np.sum(band ** 2) / num_samples)
+        if band_rms == 0:
+            # Bands narrower than the bin spacing of short signals go into the nearest bin
+            lo = int(np.argmin(np.abs(spectrum_freqs - freq)))
+            hi, band = lo + 1, np.ones(1)
+            band_rms = np.sqrt(2 / num_samples)
+        power[lo:hi] += (gain * NOISE_RMS / band_rms * band) ** 2
+
+    noise = white_noise(2 * len(spectrum_freqs), seed)
+    spectrum = noise[:len(spectrum_freqs)] + 1j * noise[len(spectrum_freqs):]
+    spectrum *= np.sqrt(power * num_samples / 2)
+    return np.fft.irfft(spectrum, num_samples)
+
+def generate_mixed_signal(freqs, dominances, widths, duration_ms, sample_rate, seed=None):
+    num_samples = int(sample_rate * (duration_ms / 1000.0))
+    freqs = np.asarray(freqs, dtype=float)
+    gains = np.asarray(dominances, dtype=float) / 100.0
+    widths = np.asarray(widths, dtype=float)
+
+    pure = widths == 0
+    signal = generate_tone_bank(freqs[pure], gains[pure], num_samples, sample_rate)
+    if not pure.all():
+        signal += generate_noise_bank(freqs[~pure], gains[~pure], widths[~pure], num_samples, sample_rate, seed)
+
+    fade_in = generate_fade(1, sample_rate, fade_in=True)
+    fade_out = generate_fade(1, sample_rate, fade_in=False)
+    signal[:len(fade_in)] *= fade_in
+    signal[-len(fade_out):] *= fade_out
+
+    return normalize_signal(signal)
+
+def normalize_signal(signal):
+    max_val = np.max(np.abs(signal))
+    if max_val > 0:
+        signal /= max_val
+    return signal
+
+def to_int16(block, out=None):
+    if out is None:
+        return np.int16(np.clip(block, -1, 1) * 32767)
+    # With an output buffer the conversion runs in place and overwrites block
+    np.clip(block, -1, 1, out=block)
+    block *= 32767
+    np.copyto(out, block, casting="unsafe")
+    return out
+
+@functools.lru_cache(maxsize=8)
+def block_ramp(num_samples):
+    ramp = np.linspace(0, 1, num_samples, dtype=np.float32)
+    ramp.flags.writeable = False
+    return ramp
+
+@functools.lru_cache(maxsize=8)
+def crossfade_curves(num_samples):
+    # Equal-power curves for crossfading two uncorrelated signals
+    fade_in = np.sqrt(block_ramp(num_samples))
+    fade_out = np.sqrt(1 - block_ramp(num_samples))
+    fade_in.flags.writeable = False
+    fade_out.flags.writeable = False
+    return fade_in, fade_out
+
+def copy_wrapped(source, position, out):
+    # Fill out from source starting at position, wrapping around its end; returns the new position
+    filled = 0
+    while filled < len(out):
+        count = min(len(out) - filled, len(source) - position)
+        out[filled:filled + count] = source[position:position + count]
+        filled += count
+        position = (position + count) % len(source)
+    return position
+
+class Oscillator:
+    def __init__(self, frequency, sample_rate):
+        self.frequency = frequency
+        self.sample_rate = sample_rate
+        self.phase = 0.0
+        self.step = 2 * np.pi * frequency / sample_rate
+        self.indices = np.zeros(0)
+        self.phases = np.zeros(0)
+
+    def render(self, out):
+        num_samples = len(out)
+        if len(self.indices) != num_samples:
+            self.indices = np.arange(num_samples, dtype=float)
+            self.phases = np.empty(num_samples)
+
+        # Carry the phase over to the next block so consecutive blocks join without discontinuities.
+        # Phases stay in float64 so long sessions keep their pitch; only the output is float32
+        step = 2 * np.pi * self.frequency / self.sample_rate
+        start = self.phase
+        if step == self.step:
+            np.multiply(self.indices, step, out=self.phases)
+            self.phase = (start + step * num_samples) % (2 * np.pi)
+        else:
+            # Glide to a new frequency across the block instead of jumping
+            steps = np.linspace(self.step, step, num_samples)
+            np.cumsum(steps, out=self.phases)
+            self.phases -= steps
+            self.phase = (start + np.sum(steps)) % (2 * np.pi)
+            self.step = step
+        self.phases += start
+        np.sin(self.phases, out=out)
+        return out
+
+MIN_FILTER_TAPS = 256
+MAX_FILTER_TAPS = 65536
+
+@functools.lru_cache(maxsize=32)
+def band_filter(frequency, freq_width, sample_rate):
+    # Keep the windowed impulse response several times longer than the Gaussian envelope (~1 / (pi * width) s)
+    taps = int(2 ** np.ceil(np.log2(8 * sample_rate / freq_width)))
+    taps = min(max(taps, MIN_FILTER_TAPS), MAX_FILTER_TAPS)
+    impulse = np.fft.irfft(gaussian_band(np.fft.rfftfreq(taps, 1 / sample_rate), frequency, freq_width), taps)
+    impulse = np.fft.fftshift(impulse) * np.hanning(taps)
+    impulse *= NOISE_RMS / np.sqrt(np.sum(impulse ** 2))
+
+    fft_size = 2 * taps
+    hop = fft_size - taps + 1
+    spectrum = np.fft.rfft(impulse, fft_size)
+    spectrum.flags.writeable = False
+    return spectrum, fft_size, hop
+
+class NarrowbandNoise:
+    def __init__(self, frequency, freq_width, sample_rate, seed=None):
+        self.frequency = frequency
+        self.freq_width = freq_width
+        self.sample_rate = sample_rate
+        self.spectrum, self.fft_size, self.hop = band_filter(frequency, freq_width, sample_rate)
+        self.overlap = np.zeros(self.fft_size - self.hop)
+        self.filtered = np.zeros(self.hop, dtype=np.float32)
+        self.noise = NoiseStream(seed)
+        self.noise_block = np.zeros(self.hop, dtype=np.float32)
+        self.filter_block()  # Run once so the filter tail is filled before the first audible block
+        self.filter_block()  # and filter that block here too, so the first render does no FFT work
+        self.position = 0
+
+    def filter_block(self):
+        # Overlap-add: filter a fresh block of white noise and carry its tail into the next block
+        noise = self.noise.read(self.noise_block)
+        filtered = np.fft.irfft(np.fft.rfft(noise, self.fft_size) * self.spectrum, self.fft_size)
+        filtered[:len(self.overlap)] += self.overlap
+        self.overlap[:] = filtered[self.hop:]
+        self.filtered[:] = filtered[:self.hop]
+
+    def render(self, out):
+        filled = 0
+        while filled < len(out):
+            if self.position == self.hop:
+                self.filter_block()
+                self.position = 0
+            count = min(len(out) - filled, self.hop - self.position)
+            out[filled:filled + count] = self.filtered[self.position:self.position + count]
+            filled += count
+            self.position += count
+        return out
+
+NOISE_COLORS = ("white", "pink", "brown")
+PINK_SAMPLE_RATE = 44100
+PINK_B = [0.049922035, -0.095993537, 0.050612699, -0.004408786]
+PINK_A = [1.0, -2.494956002, 2.017265875, -0.522189400]
+
+@functools.lru_cache(maxsize=8)
+def color_filter(color, sample_rate):
+    # Second-order sections shaping white noise, and the gain that brings the result to NOISE_RMS
+    from scipy import signal
+    if color == "white":
+        sos = np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+    elif color == "pink":
+        # Julius O. Smith's three-pole -3 dB/octave filter, designed at 44.1 kHz. Its poles and zeros are
+        # real, so mapping each one through the matched z-transform (r -> r ** (44100 / sample_rate))
+        # keeps their corner frequencies, and so the slope, at any other sample rate
+        scale = PINK_SAMPLE_RATE / sample_rate
+        sos = signal.zpk2sos(np.roots(PINK_B) ** scale, np.roots(PINK_A) ** scale, 1.0)
+    elif color == "brown":
+        # Leaky integrator: -6 dB/octave above a corner of a few Hz, without the drift of a pure integrator
+        sos = signal.tf2sos([1.0], [1.0, -np.exp(-2 * np.pi * 15 / sample_rate)])
+    else:
+        raise ValueError(f"Unknown noise color {color!r}, expected one of {', '.join(NOISE_COLORS)}.")
+    impulse = signal.sosfilt(sos, np.r_[1.0, np.zeros(sample_rate - 1)])
+    return sos, NOISE_RMS / np.sqrt(np.sum(impulse ** 2))
+
+NOTCH_ORDER = 4  # Butterworth prototype order, giving an 8th-order band-cut in NOTCH_ORDER sections
+
+@functools.lru_cache(maxsize=64)
+def notch_filter(frequency, octaves, depth_db, sample_rate):
+    # Butterworth band-cut with a finite depth: the low-pass prototype |H|^2 = (1 + G^2 w^2N) / (1 + w^2N)
+    # is flat at DC, falls to G = -depth_db at infinity and crosses -3 dB at w = 1. The band-stop transform
+    # maps DC to everything outside the notch, infinity to its centre and w = 1 to the two edges, so the
+    # width in octaves is measured between the -3 dB points (for notches deeper than about 10 dB)
+    from scipy import signal
+    edges = np.array([frequency * 2 ** (-octaves / 2), frequency * 2 ** (octaves / 2)])
+    edges = np.minimum(edges, 0.49 * sample_rate)
+    warped = 2 * sample_rate * np.tan(np.pi * edges / sample_rate)  # Pre-warp for the bilinear transform
+    _, poles, _ = signal.buttap(NOTCH_ORDER)
+    root_gain = 10 ** (-depth_db / 20 / NOTCH_ORDER)
+    zeros, poles, gain = signal.lp2bs_zpk(poles / root_gain, poles, root_gain ** NOTCH_ORDER,
+                                          wo=np.sqrt(warped[0] * warped[1]), bw=warped[1] - warped[0])
+    return signal.zpk2sos(*signal.bilinear_zpk(zeros, poles, gain, sample_rate))
+
+class MaskingNoise:
+    def __init__(self, sample_rate, color="white", notch_frequency=None, notch_octaves=1.0, notch_depth_db=40, seed=None):
+        self.sample_rate = sample_rate
+        self.noise = NoiseStream(seed)
+        self.color_sos, self.gain = color_filter(color, sample_rate)
+        self.color_state = np.zeros((len(self.color_sos), 2))
+        self.notch_state = np.zeros((NOTCH_ORDER, 2))
+        self.set_notch(notch_frequency, notch_octaves, notch_depth_db)
+
+    def set_notch(self, frequency, octaves, depth_db):
+        # The filter state is kept, so moving the notch while playing does not restart the noise
+        if frequency is None or depth_db <= 0 or octaves <= 0:
+            self.notch_sos = None
+        else:
+            self.notch_sos = notch_filter(float(frequency), float(octaves), float(depth_db), self.sample_rate)
+
+    def render(self, out):
+        from scipy import signal
+        noise = self.noise.read(out)
+        noise *= self.gain
+        shaped, self.color_state = signal.sosfilt(self.color_sos, noise, zi=self.color_state)
+        if self.notch_sos is not None:
+            shaped, self.notch_state = signal.sosfilt(self.notch_sos, shaped, zi=self.notch_state)
+        out[:] = shaped
+        return out
+
+class BufferCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get_or_create(self, key, create):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        buffer = create()
+        buffer.flags.writeable = False
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = buffer
+                self.size += buffer.nbytes
+                # Evict least recently used buffers, but always keep the one just created
+                while self.size > self.max_bytes and len(self.entries) > 1:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= evicted.nbytes
+        return buffer
+
+LOOP_MS = 4000
+tone_cache = BufferCache(max_bytes=128 * 1024 * 1024)
+
+def render_loop(frequency, freq_width, sample_rate, duration_ms):
+    max_length = int(sample_rate * (duration_ms / 1000.0))
+    if freq_width == 0:
+        # Pick the loop length holding a whole number of periods with the smallest pitch error
+        cycles = np.arange(1, int(frequency * max_length / sample_rate) + 1)
+        lengths = np.round(cycles * sample_rate / frequency)
+        best = np.argmin(np.abs(cycles * sample_rate / lengths - frequency))
+        return np.sin(2 * np.pi * cycles[best] * np.arange(lengths[best]) / lengths[best]).astype(np.float32)
+
+    # Filtering in the frequency domain is a circular convolution, so the band already wraps
+    # around seamlessly and needs no crossfade at the loop point
+    signal = band_noise(frequency, freq_width, max_length, sample_rate)
+    return (signal * (NOISE_RMS / np.std(signal))).astype(np.float32)
+
+def loopable_wave(frequency, freq_width, sample_rate, duration_ms=LOOP_MS):
+    key = ("loop", frequency, freq_width, sample_rate, duration_ms)
+    return tone_cache.get_or_create(key, lambda: render_loop(frequency, freq_width, sample_rate, duration_ms))
+
+def cached_wave(frequency, duration_ms, sample_rate, freq_width=0):
+    key = ("wave", frequency, freq_width, sample_rate, duration_ms)
+    return tone_cache.get_or_create(key, lambda: generate_wave(frequency, duration_ms, sample_rate, freq_width).astype(np.float32))
+
+def cached_mix(freqs, dominances, widths, duration_ms, sample_rate):
+    key = ("mix", tuple(freqs), tuple(dominances), tuple(widths), sample_rate, duration_ms)
+    return tone_cache.get_or_create(key, lambda: generate_mixed_signal(freqs, dominances, widths, duration_ms, sample_rate).astype(np.float32))
+
+class LoopPlayer:
+    def __init__(self, loop, frequency, sample_rate):
+        self.loop = loop
+        self.frequency = frequency
+        self.sample_rate = sample_rate
+        self.position = 0
+
+    def render(self, out):
+        self.position = copy_wrapped(self.loop, self.position, out)
+        return out
+
+    def to_oscillator(self):
+        # A pure loop holds whole periods, so its phase follows directly from the loop position
+        oscillator = Oscillator(self.frequency, self.sample_rate)
+        oscillator.phase = (2 * np.pi * self.frequency * self.position / self.sample_rate) % (2 * np.pi)
+        return oscillator
+
+def create_generator(frequency, freq_width, sample_rate, looped=False, seed=None):
+    if looped:
+        return LoopPlayer(loopable_wave(frequency, freq_width, sample_rate), frequency, sample_rate)
+    if freq_width == 0:
+        return Oscillator(frequency, sample_rate)
+    return NarrowbandNoise(frequency, freq_width, sample_rate, seed)
+
+class Voice:
+    def __init__(self, frequency, freq_width, sample_rate, looped=False, seed=None):
+        self.frequency = frequency
+        self.freq_width = freq_width
+        self.sample_rate = sample_rate
+        self.looped = looped
+        # Every new noise generator gets the next child seed, so a seeded voice stays reproducible
+        # across parameter changes without ever repeating its noise
+        self.seed = noise_seed(seed)
+        self.generator = create_generator(frequency, freq_width, sample_rate, looped, self.seed.spawn(1)[0])
+        self.previous = None
+        self.prepared = None  # (frequency, freq_width, generator) built ahead of set_params
+        self.lock = threading.Lock()
+
+    def needs_generator(self, frequency, freq_width):
+        return (frequency, freq_width) != (self.frequency, self.freq_width) and (freq_width != 0 or self.freq_width != 0)
+
+    def create(self, frequency, freq_width):
+        # Only the first generator of a looped voice plays a cached loop. Rendering a new loop for
+        # every slider position would cost a multi-second band render each time and fill tone_cache,
+        # so changes stream from a NarrowbandNoise the same way a looped pure tone moves to an Oscillator
+        return create_generator(frequency, freq_width, self.sample_rate, looped=False, seed=self.seed.spawn(1)[0])
+
+    def prepare(self, frequency, freq_width):
+        # Building a noise generator means designing a filter and running FFTs of up to 131072 points,
+        # so it happens ahead of set_params and never on the thread rendering blocks
+        with self.lock:
+            if self.prepared is not None and self.prepared[:2] == (frequency, freq_width):
+                return
+        if self.needs_generator(frequency, freq_width):
+            generator = self.create(frequency, freq_width)
+            with self.lock:
+                self.prepared = (frequency, freq_width, generator)
+
+    def take_prepared(self, frequency, freq_width):
+        with self.lock:
+            prepared, self.prepared = self.prepared, None
+        if prepared is not None and prepared[:2] == (frequency, freq_width):
+            return prepared[2]
+        # Only reached when the parameters changed between prepare and this block
+        return self.create(frequency, freq_width)
+
+    def set_params(self, frequency, freq_width):
+        if frequency == self.frequency and freq_width == self.freq_width:
+            return
+        generator = self.take_prepared(frequency, freq_width) if self.needs_generator(frequency, freq_width) else None
+        if generator is None:
+            # Pure tones glide, so a looped one hands over to a free-running oscillator at the same phase
+            if isinstance(self.generator, LoopPlayer):
+                self.generator = self.generator.to_oscillator()
+            self.generator.frequency = frequency
+        else:
+            # A noise band needs a new filter, so crossfade from the old generator to the fresh one
+            self.previous = self.generator
+            self.generator = generator
+        self.frequency = frequency
+        self.freq_width = freq_width
+
+    def render(self, out, scratch):
+        self.generator.render(out)
+        if self.previous is not None:
+            fade_in, fade_out = crossfade_curves(len(out))
+            self.previous.render(scratch)
+            out *= fade_in
+            scratch *= fade_out
+            out += scratch
+            self.previous = None
+        return out
+
+class BlockStream(abc.ABC):
+    def __init__(self, sample_rate, block_size=1024):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.position = 0
+        self.fade_in = generate_fade(1, sample_rate, fade_in=True)
+        self.fade_out = generate_fade(1, sample_rate, fade_in=False)
+        self.pending = None
+        self.lock = threading.Lock()
+        # Reused for every block, so a block returned by next_block is only valid until the next call
+        self.block = np.zeros(block_size, dtype=np.float32)
+
+    def update(self, *params):
+        # Picked up at the start of the next block, from whichever thread renders the stream
+        with self.lock:
+            self.pending = params
+
+    def apply(self, *params):
+        pass  # Streams without live parameters ignore updates
+
+    @abc.abstractmethod
+    def render_block(self, block):
+        pass
+
+    def next_block(self):
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            self.apply(*pending)
+
+        block = self.render_block(self.block)
+        if self.position < len(self.fade_in):
+            fade = self.fade_in[self.position:self.position + self.block_size]
+            block[:len(fade)] *= fade
+        self.position += self.block_size
+        return block
+
+    def last_block(self):
+        block = self.next_block()
+        fade = self.fade_out[-self.block_size:]
+        block[-len(fade):] *= fade
+        return block
+
+class ToneStream(BlockStream):
+    def __init__(self, freqs, dominances, widths, sample_rate, block_size=1024, looped=False, seed=None,
+                 executor=None):
+        super().__init__(sample_rate, block_size)
+        seeds = noise_seed(seed).spawn(len(freqs))
+        self.voices = [Voice(freq, width, sample_rate, looped, voice_seed) for freq, width, voice_seed in zip(freqs, widths, seeds)]
+        self.gains = self.normalized_gains(dominances)
+        self.previous_gains = self.gains
+        self.voice_block = np.zeros(block_size, dtype=np.float32)
+        self.scratch = np.zeros(block_size, dtype=np.float32)
+        # Without an executor, updates prepare their generators on the calling thread
+        self.executor = executor
+        self.requested = None
+        self.preparing = False
+
+    @staticmethod
+    def normalized_gains(dominances):
+        # Scale by the summed gains so the mix can never exceed full scale, whatever the block length
+        gains = np.asarray(dominances, dtype=float) / 100.0
+        total_gain = np.sum(gains)
+        return gains / total_gain if total_gain > 0 else gains
+
+    def update(self, freqs, dominances, widths):
+        if len(freqs) != len(self.voices):
+            raise ValueError("The number of tones of a running stream cannot change.")
+        params = (list(freqs), list(dominances), list(widths))
+        if self.executor is None:
+            self.prepare(*params)
+            return
+        with self.lock:
+            self.requested = params
+            if self.preparing:
+                return  # The running preparation picks up the latest request
+            self.preparing = True
+        self.executor.submit(self.prepare_requested)
+
+    def prepare_requested(self):
+        # A slider drag asks for changes faster than narrow bands can be built, so only the latest one is prepared
+        while True:
+            with self.lock:
+                params, self.requested = self.requested, None
+                if params is None:
+                    self.preparing = False
+                    return
+            try:
+                self.prepare(*params)
+            except BaseException:
+                with self.lock:
+                    self.preparing = False
+                raise
+
+    def prepare(self, freqs, dominances, widths):
+        for voice, freq, width in zip(self.voices, freqs, widths):
+            voice.prepare(freq, width)
+        super().update(freqs, dominances, widths)
+
+    def apply(self, freqs, dominances, widths):
+        for voice, freq, width in zip(self.voices, freqs, widths):
+            voice.set_params(freq, width)
+        self.gains = self.normalized_gains(dominances)
+
+    def render_block(self, block):
+        block.fill(0)
+        for voice, start_gain, end_gain in zip(self.voices, self.previous_gains, self.gains):
+            if start_gain > 0 or end_gain > 0:
+                voice.render(self.voice_block, self.scratch)
+                if start_gain == end_gain:
+                    self.voice_block *= end_gain
+                else:
+                    np.multiply(block_ramp(self.block_size), end_gain - start_gain, out=self.scratch)
+                    self.scratch += start_gain
+                    self.voice_block *= self.scratch
+                block += self.voice_block
+        self.previous_gains = self.gains
+        return block
+
+class MaskingStream(BlockStream):
+    def __init__(self, sample_rate, color="white", notch_frequency=None, notch_octaves=1.0, notch_depth_db=40,
+                 block_size=1024, seed=None):
+        super().__init__(sample_rate, block_size)
+        self.noise = MaskingNoise(sample_rate, color, notch_frequency, notch_octaves, notch_depth_db, seed)
+
+    def update(self, notch_frequency, notch_octaves, notch_depth_db):
+        super().update(notch_frequency, notch_octaves, notch_depth_db)
+
+    def apply(self, notch_frequency, notch_octaves, notch_depth_db):
+        self.noise.set_notch(notch_frequency, notch_octaves, notch_depth_db)
+
+    def render_block(self, block):
+        return self.noise.render(block)
+
+class BufferSource:
+    def __init__(self, signal, block_size=1024):
+        self.signal = signal
+        self.block_size = block_size
+        self.position = 0
+        self.padded = np.zeros(block_size, dtype=np.float32)
+
+    def next_block(self):
+        if self.position >= len(self.signal):
+            return None
+        part = self.signal[self.position:self.position + self.block_size]
+        self.position += self.block_size
+        if len(part) == self.block_size:
+            return part
+        self.padded[:len(part)] = part
+        self.padded[len(part):] = 0
+        return self.padded
+
+    def last_block(self):
+        return None
+
+class PcmSource:
+    def __init__(self, pcm, block_size=1024):
+        # pcm is usually a read-only memory map, so only the pages around the play position are ever loaded
+        self.pcm = pcm
+        self.block_size = block_size
+        self.position = 0
+        self.block = np.zeros(block_size, dtype=np.float32)
+
+    def next_block(self):
+        if self.position >= len(self.pcm):
+            return None
+        part = self.pcm[self.position:self.position + self.block_size]
+        self.position += self.block_size
+        np.multiply(part, 1 / 32767, out=self.block[:len(part)], casting="unsafe")
+        self.block[len(part):] = 0
+        return self.block
+
+    def last_block(self):
+        return None
+
+def render_blocks(freqs, dominances, widths, duration_ms, sample_rate, block_size=65536, seed=None):
+    # Stream block by block so memory use does not depend on the duration
+    tone_stream = ToneStream(freqs, dominances, widths, sample_rate, block_size, seed=seed)
+    total_samples = int(sample_rate * (duration_ms / 1000.0))
+    fade_out = generate_fade(1, sample_rate, fade_in=False)
+    written = 0
+    while written < total_samples:
+        block = tone_stream.next_block()[:total_samples - written]
+        written += len(block)
+        if written == total_samples:
+            block[-len(fade_out):] *= fade_out[-len(block):]
+        yield block
+
+def render_to_wav(path, freqs, dominances, widths, duration_ms, sample_rate=44100, block_size=65536, seed=None):
+    pcm = np.zeros(block_size, dtype=np.int16)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for block in render_blocks(freqs, dominances, widths, duration_ms, sample_rate, block_size, seed):
+            wav.writeframes(to_int16(block, out=pcm[:len(block)]))
+    return path
+
+def render_to_npy(path, freqs, dominances, widths, duration_ms, sample_rate=44100, block_size=65536, seed=None):
+    # int16 halves the file size against float32, and the blocks are converted straight into the mapped file
+    total_samples = int(sample_rate * (duration_ms / 1000.0))
+    pcm = np.lib.format.open_memmap(path, mode="w+", dtype=np.int16, shape=(total_samples,))
+    written = 0
+    for block in render_blocks(freqs, dominances, widths, duration_ms, sample_rate, block_size, seed):
+        to_int16(block, out=pcm[written:written + len(block)])
+        written += len(block)
+    pcm.flush()
+    del pcm  # Unmap before the caller renames the file, which Windows refuses while it is mapped
+    return path
+
+def check_tone_params(freqs, dominances, widths):
+    # zip would silently drop tones without a dominance or width, and a negative width breaks the band filter
+    if not len(freqs) or any(freq < 100 or freq > 20000 for freq in freqs):
+        raise ValueError("Frequencies must be between 100 Hz and 20000 Hz.")
+    if len(dominances) != len(freqs) or len(widths) != len(freqs):
+        raise ValueError("Each frequency needs exactly one dominance and one width.")
+    if any(width < 0 for width in widths):
+        raise ValueError("Frequency widths cannot be negative.")
+
+def profile_path(profile, output_dir):
+    # Profile files may come from anywhere, so a name must not be able to point outside output_dir
+    name = str(profile["name"])
+    if not name or os.path.basename(name) != name or (os.altsep and os.altsep in name) or name in (".", ".."):
+        raise ValueError(f"Profile name {name!r} must be a plain file name without path separators.")
+    return os.path.join(output_dir, f"{name}.wav")
+
+def profile_params(profile):
+    # Only the frequencies are required, the rest defaults to full-volume pure tones
+    freqs = profile["freqs"]
+    dominances = profile.get("dominances", [100] * len(freqs))
+    widths = profile.get("widths", [0] * len(freqs))
+    return freqs, dominances, widths
+
+def render_profile(profile, output_dir, duration_ms, sample_rate):
+    freqs, dominances, widths = profile_params(profile)
+    path = profile_path(profile, output_dir)
+    duration_ms = profile.get("duration", duration_ms / 1000.0) * 1000
+    return render_to_wav(path, freqs, dominances, widths, duration_ms, sample_rate, seed=profile.get("seed"))
+
+def render_profiles(profiles, output_dir, duration_ms, sample_rate, workers=None):
+    for profile in profiles:
+        # Reject bad profiles before anything is rendered
+        profile_path(profile, output_dir)
+        try:
+            check_tone_params(*profile_params(profile))
+        except ValueError as error:
+            raise ValueError(f"Profile {profile['name']!r}: {error}") from None
+    os.makedirs(output_dir, exist_ok=True)
+    # Noise comes from per-profile seeds rather than global state, so forked workers never share a stream
+    # and a seeded profile renders the same samples whichever worker picks it up
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_profile, profile, output_dir, duration_ms, sample_rate) for profile in profiles]
+        for future in as_completed(futures):
+            yield future.result()
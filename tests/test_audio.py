@@ -0,0 +1,111 @@
+import threading
+import wave
+import numpy as np
+import pytest
+
+import audio
+import synthesis
+
+def test_ring_buffer_wraps_around():
+    ring = audio.RingBuffer(8)
+    out = np.zeros(5, dtype=np.int16)
+    assert ring.write(np.arange(1, 6, dtype=np.int16)) == 5
+    assert ring.read(out) == 5
+    assert ring.write(np.arange(6, 14, dtype=np.int16)) == 8  # Wraps past the end of the storage
+    assert ring.write(np.array([99], dtype=np.int16)) == 0  # Full
+    first = np.zeros(8, dtype=np.int16)
+    assert ring.read(first) == 8
+    assert first.tolist() == list(range(6, 14))
+    assert ring.read(out) == 0
+    assert out.tolist() == [0] * 5  # Padded with silence when empty
+
+def test_failed_backend_open_leaves_the_engine_stopped():
+    class FailingBackend(audio.NullBackend):
+        def open(self, sample_rate, block_size, pull):
+            raise OSError("no device")
+
+    engine = audio.OutputEngine(backend=FailingBackend())
+    with pytest.raises(OSError):
+        engine.start_async().result()
+    assert not engine.running
+    with pytest.raises(OSError):
+        engine.play(synthesis.ToneStream([1000], [100], [0], 44100))
+    engine.close()
+
+def play_until_ended(engine, create_source, timeout=5):
+    ended = []
+    done = threading.Event()
+    engine.on_session_end = lambda source, metrics: (ended.append(metrics), done.set())
+    engine.play_async(create_source).result(timeout)
+    assert done.wait(timeout)
+    return ended[0]
+
+def test_output_engine_reports_session_metrics_on_a_null_backend():
+    sessions = []
+    engine = audio.OutputEngine(44100, 1024, backend=audio.NullBackend())
+    try:
+        engine.on_session_end = lambda source, metrics: sessions.append(metrics)
+        stream = engine.play(synthesis.ToneStream([1000], [100], [0], 44100))
+        assert engine.is_playing(stream)
+        assert engine.metrics(stream) is not None
+        threading.Event().wait(0.2)
+        engine.stop(stream)
+        for _ in range(50):
+            if sessions:
+                break
+            threading.Event().wait(0.1)
+        assert not engine.is_playing(stream)
+        summary = sessions[0].summary()
+        assert summary["blocks"] > 0
+        assert summary["time_to_first_sample_ms"] is not None
+        assert summary["block_latency_ms"]["p50"] >= 0
+        assert "overruns" not in summary
+    finally:
+        engine.close()
+
+def test_play_async_counts_source_creation_as_synthesis():
+    def create_source():
+        threading.Event().wait(0.05)
+        return synthesis.BufferSource(np.zeros(2048, dtype=np.float32), 1024)
+
+    engine = audio.OutputEngine(44100, 1024, backend=audio.NullBackend())
+    try:
+        summary = play_until_ended(engine, create_source).summary()
+    finally:
+        engine.close()
+    assert summary["generation_ms"] >= 50
+    assert summary["time_to_first_sample_ms"] >= 50
+
+def test_output_engine_limits_the_mix_written_to_a_wave_file(tmp_path):
+    path = tmp_path / "out.wav"
+    engine = audio.OutputEngine(44100, 1024, backend=audio.WaveFileBackend(str(path)))
+    try:
+        # Two full-scale tones at once would clip without the limiter, which holds peaks at -1 dBFS
+        tone = synthesis.generate_wave(1000, 300, 44100).astype(np.float32)
+        engine.play_async(lambda: synthesis.BufferSource(tone, 1024)).result(5)
+        play_until_ended(engine, lambda: synthesis.BufferSource(tone, 1024))
+    finally:
+        engine.close()
+    with wave.open(str(path)) as wav:
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    assert np.max(np.abs(samples)) == pytest.approx(32767 * 10 ** (-1 / 20), rel=0.01)
+
+def test_play_async_reports_a_failing_source():
+    engine = audio.OutputEngine(44100, 1024, backend=audio.NullBackend())
+
+    def create_source():
+        raise RuntimeError("render failed")
+    try:
+        with pytest.raises(RuntimeError):
+            engine.play_async(create_source).result(5)
+        assert not engine.sources
+    finally:
+        engine.close()
+
+def test_output_monitor_reads_a_full_scale_sine_at_0_dbfs():
+    monitor = audio.OutputMonitor(44100)
+    monitor.write(synthesis.to_int16(np.sin(2 * np.pi * 1000 * np.arange(8192) / 44100)))
+    levels_db, peak_db, rms_db = monitor.analyze()
+    assert max(levels_db) == pytest.approx(0, abs=0.5)
+    assert peak_db == pytest.approx(0, abs=0.1)
+    assert rms_db == pytest.approx(-3, abs=0.1)
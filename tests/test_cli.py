@@ -0,0 +1,50 @@
+import json
+import wave
+import pytest
+
+import synthesis
+import TinPop
+
+def test_render_streams_a_wav_file(tmp_path):
+    path = tmp_path / "out.wav"
+    assert TinPop.main(["render", str(path), "--freqs", "1000,4000", "--widths", "0,100", "--duration", "2"]) == 0
+    with wave.open(str(path)) as wav:
+        assert wav.getnframes() == 88200
+        assert wav.getframerate() == 44100
+
+@pytest.mark.parametrize("args", [
+    ["--freqs", "50"],
+    ["--freqs", "1000,3000", "--dominances", "100"],
+    ["--freqs", "1000", "--widths", "-5"],
+    ["--freqs", "abc"],
+])
+def test_render_rejects_invalid_tones(tmp_path, args):
+    with pytest.raises(SystemExit):
+        TinPop.main(["render", str(tmp_path / "out.wav")] + args)
+    assert not (tmp_path / "out.wav").exists()
+
+@pytest.mark.parametrize("profile", [
+    {"name": "a", "freqs": [1000, 3000], "dominances": [100]},
+    {"name": "a", "freqs": [1000], "widths": [-1]},
+    {"name": "a", "freqs": [30000]},
+    {"name": "../a", "freqs": [1000]},
+])
+def test_batch_rejects_invalid_profiles_before_rendering(tmp_path, profile):
+    profiles = tmp_path / "profiles.json"
+    profiles.write_text(json.dumps([{"name": "good", "freqs": [1000]}, profile]))
+    with pytest.raises(SystemExit):
+        TinPop.main(["batch", str(profiles), str(tmp_path / "out")])
+    assert not (tmp_path / "out").exists()
+
+@pytest.mark.parametrize("name", ["../evil", "a/b", "", ".."])
+def test_profile_names_cannot_leave_the_output_directory(tmp_path, name):
+    with pytest.raises(ValueError):
+        synthesis.profile_path({"name": name, "freqs": [1000]}, str(tmp_path))
+
+def test_batch_renders_every_profile(tmp_path, capsys):
+    profiles = tmp_path / "profiles.json"
+    profiles.write_text(json.dumps([{"name": "a", "freqs": [1000]}, {"name": "b", "freqs": [2000], "widths": [50], "duration": 0.5}]))
+    assert TinPop.main(["batch", str(profiles), str(tmp_path / "out"), "--duration", "1", "--workers", "2"]) == 0
+    assert sorted(path.name for path in (tmp_path / "out").iterdir()) == ["a.wav", "b.wav"]
+    with wave.open(str(tmp_path / "out" / "b.wav")) as wav:
+        assert wav.getnframes() == 22050
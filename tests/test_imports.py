@@ -0,0 +1,10 @@
+import subprocess
+import sys
+import pytest
+
+@pytest.mark.parametrize("module", ["synthesis", "audio", "matching", "profiles", "TinPop"])
+def test_headless_modules_do_not_import_tk_or_portaudio(module):
+    # A fresh interpreter, since the test session may already have loaded either
+    code = f"import sys, {module}; print(sorted(name for name in ('tkinter', '_tkinter', 'pyaudio') if name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from matching import MatchingProcedure, MatchingSession
+
+def listener(target):
+    # Always picks the candidate closer to the target on a log-frequency scale
+    def answer(a, b):
+        distance_a, distance_b = abs(np.log2(a / target)), abs(np.log2(b / target))
+        return "a" if distance_a < distance_b else "b" if distance_b < distance_a else "same"
+    return answer
+
+@pytest.mark.parametrize("start", [200, 1000, 8000])
+@pytest.mark.parametrize("target", [150, 440, 3000, 6123, 11000, 19000])
+def test_procedure_converges_to_the_target(start, target):
+    procedure = MatchingProcedure()
+    state = procedure.start(start)
+    answer = listener(target)
+    for _ in range(30):
+        if state.phase == "done":
+            break
+        state = procedure.advance(state, answer(*procedure.trial(state)))
+    assert state.phase == "done"
+    assert abs(np.log2(state.current / target)) < 1 / 12
+
+def test_procedure_rejects_unknown_answers():
+    procedure = MatchingProcedure()
+    with pytest.raises(ValueError):
+        procedure.advance(procedure.start(1000), "c")
+
+def test_session_records_a_trace_of_answered_trials():
+    session = MatchingSession(1000, 44100)
+    answer = listener(3000)
+    while not session.done:
+        trial = session.present()
+        assert session.source(trial, 1024) is not None
+        session.answer(answer(*trial))
+    assert abs(np.log2(session.result / 3000)) < 1 / 12
+    assert all(entry["choice"] is not None and entry["phase"] for entry in session.trace)
+    assert session.summary()["trials"] == len(session.trace)
+
+def test_session_prefetches_every_trial_an_answer_can_lead_to():
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        session = MatchingSession(1000, 44100, freq_width=50, executor=executor)
+        answer = listener(440)
+        while not session.done:
+            trial = session.present()
+            for future in list(session.prefetched.values()):
+                future.result()  # A listener takes far longer to answer than the candidates take to render
+            session.source(trial)
+            session.answer(answer(*trial))
+    assert session.summary()["prefetch_hits"] == session.summary()["trials"]
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+
+from profiles import ProfileStore, RenderCache
+
+def test_profiles_are_saved_and_replaced_by_name(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.json"))
+    assert store.load() == []
+    store.save("a", [1000, 3000], [100, 50], [0, 200])
+    store.save("b", [500], [100], [0])
+    store.save("a", [2000], [80], [10])
+    assert store.names() == ["b", "a"]
+    assert store.get("a") == {"name": "a", "freqs": [2000], "dominances": [80], "widths": [10]}
+    assert store.get("missing") is None
+
+def test_render_cache_maps_renders_and_evicts_the_least_recently_used(tmp_path):
+    params = ([1000], [100], [0], 1000, 44100)
+    cache = RenderCache(str(tmp_path), max_bytes=2 * 44100 * 2 + 1024)
+    pcm = cache.open(*params)
+    assert isinstance(pcm, np.memmap) and pcm.dtype == np.int16 and len(pcm) == 44100
+    assert cache.contains(*params)
+    assert np.array_equal(cache.open(*params), pcm)
+
+    for frequency in (2000, 3000):
+        os.utime(cache.path(*params), (0, 0))  # Make the first render the least recently used
+        cache.open([frequency], [100], [0], 1000, 44100)
+    assert not cache.contains(*params)
+    assert cache.contains([3000], [100], [0], 1000, 44100)
+
+def test_concurrent_opens_of_one_render_share_it(tmp_path, monkeypatch):
+    import profiles
+    from concurrent.futures import ThreadPoolExecutor
+    renders = []
+    render_to_npy = profiles.render_to_npy
+    monkeypatch.setattr(profiles, "render_to_npy", lambda *args: renders.append(args) or render_to_npy(*args))
+    cache = RenderCache(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pcms = list(executor.map(lambda _: cache.open([1000], [100], [0], 500, 44100), range(4)))
+    assert len(renders) == 1
+    assert all(np.array_equal(pcm, pcms[0]) for pcm in pcms)
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+def test_loaded_profiles_default_missing_dominances_and_widths(tmp_path):
+    from synthesis import profile_params
+    store = ProfileStore(str(tmp_path / "profiles.json"))
+    (tmp_path / "profiles.json").write_text('[{"name": "old", "freqs": [1000, 3000]}]')
+    assert profile_params(store.get("old")) == ([1000, 3000], [100, 100], [0, 0])
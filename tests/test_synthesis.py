@@ -0,0 +1,188 @@
+import numpy as np
+import pytest
+
+import synthesis
+
+def test_generate_mixed_signal_is_peak_normalized_with_balanced_levels():
+    sample_rate = 44100
+    signal = synthesis.generate_mixed_signal([1000, 3000], [100, 50], [0, 0], 1000, sample_rate)
+    assert len(signal) == sample_rate
+    assert np.max(np.abs(signal)) == pytest.approx(1.0)
+
+    spectrum = np.abs(np.fft.rfft(signal[sample_rate // 4:3 * sample_rate // 4]))
+    freqs = np.fft.rfftfreq(sample_rate // 2, 1 / sample_rate)
+    ratio = spectrum[np.argmin(np.abs(freqs - 3000))] / spectrum[np.argmin(np.abs(freqs - 1000))]
+    assert ratio == pytest.approx(0.5, rel=0.02)
+
+def test_noise_bank_keeps_the_band_level():
+    sample_rate = 44100
+    band = synthesis.generate_noise_bank([2000], [1.0], [100], 10 * sample_rate, sample_rate)
+    assert np.std(band) == pytest.approx(synthesis.NOISE_RMS, rel=0.05)
+
+@pytest.mark.parametrize("width", [5, 0.5])
+def test_short_narrow_noise_bands_are_not_dropped(width):
+    # 25 ms has a 40 Hz bin spacing, so no bin lies within a few widths of 1020 Hz
+    signal = synthesis.generate_mixed_signal([1020], [100], [width], 25, 44100)
+    assert np.max(np.abs(signal)) == pytest.approx(1.0)
+
+def test_tone_stream_updates_are_continuous():
+    stream = synthesis.ToneStream([1000, 3000], [100, 50], [0, 40], 44100)
+    blocks = [stream.next_block().copy() for _ in range(20)]
+    stream.update([1200, 3000], [100, 50], [0, 80])
+    blocks += [stream.next_block().copy() for _ in range(20)]
+    signal = np.concatenate(blocks)
+    assert np.max(np.abs(signal)) <= 1.0
+    assert np.max(np.abs(np.diff(signal))) < 0.3
+
+def test_tone_stream_prepares_noise_generators_on_its_executor():
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=1)
+    stream = synthesis.ToneStream([1000], [100], [5], 44100, executor=executor)
+    stream.next_block()
+    for width in range(6, 12):
+        stream.update([1000], [100], [width])
+    executor.shutdown(wait=True)
+
+    def create(frequency, freq_width):
+        raise AssertionError("Generator built while rendering")
+    voice = stream.voices[0]
+    voice.create = create
+    stream.next_block()
+    assert voice.freq_width == 11
+    assert isinstance(voice.generator, synthesis.NarrowbandNoise)
+
+def test_tone_stream_rejects_a_different_number_of_tones():
+    stream = synthesis.ToneStream([1000], [100], [0], 44100)
+    with pytest.raises(ValueError):
+        stream.update([1000, 2000], [100, 100], [0, 0])
+
+def test_buffer_cache_evicts_the_least_recently_used_buffers_by_size():
+    cache = synthesis.BufferCache(max_bytes=3 * 400)
+    created = []
+
+    def get(key):
+        return cache.get_or_create(key, lambda: created.append(key) or np.zeros(100, dtype=np.float32))
+
+    for key in "abc":
+        get(key)
+    get("a")  # Now the most recently used
+    get("d")
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert cache.size == 3 * 400
+    get("a")
+    assert created == list("abcd")
+    with pytest.raises(ValueError):
+        get("a")[0] = 1  # Cached buffers are shared, so they are read-only
+
+    big = cache.get_or_create("big", lambda: np.zeros(1000, dtype=np.float32))
+    assert list(cache.entries) == ["big"]  # The buffer just created is kept even when it alone is too big
+    assert cache.size == big.nbytes
+
+def test_loopable_waves_wrap_around_seamlessly():
+    loop = synthesis.loopable_wave(1000, 0, 44100)
+    wrapped = np.concatenate((loop[-100:], loop[:100]))
+    assert np.max(np.abs(np.diff(wrapped))) <= np.max(np.abs(np.diff(loop))) + 1e-6
+    assert synthesis.loopable_wave(1000, 0, 44100) is loop
+
+def test_masking_notch_has_its_depth_and_3_db_edges():
+    from scipy import signal
+    sample_rate = 44100
+    sos = synthesis.notch_filter(4000.0, 1.0, 40.0, sample_rate)
+    _, response = signal.sosfreqz(sos, [2000, 4000 / np.sqrt(2), 4000, 4000 * np.sqrt(2), 8000], fs=sample_rate)
+    assert np.round(20 * np.log10(np.abs(response)), 1).tolist() == pytest.approx([0, -3, -40, -3, 0], abs=0.2)
+
+@pytest.mark.parametrize("sample_rate", [44100, 48000, 96000])
+def test_pink_noise_falls_by_3_db_per_octave(sample_rate):
+    from scipy import signal
+    freqs = [250, 500, 1000, 2000, 4000]
+    _, response = signal.sosfreqz(synthesis.color_filter("pink", sample_rate)[0], freqs, fs=sample_rate)
+    _, reference = signal.sosfreqz(synthesis.color_filter("pink", 44100)[0], freqs, fs=44100)
+    levels_db = 20 * np.log10(np.abs(response))
+    assert (levels_db[-1] - levels_db[0]) / 4 == pytest.approx(-3.01, abs=0.1)
+    # The three-pole fit ripples around the slope by about half a dB, the same way at every rate
+    assert levels_db - levels_db[0] == pytest.approx(20 * np.log10(np.abs(reference / reference[0])), abs=0.05)
+
+@pytest.mark.parametrize("color", synthesis.NOISE_COLORS)
+def test_masking_streams_keep_their_level(color):
+    sample_rate = 44100
+    stream = synthesis.MaskingStream(sample_rate, color, 4000, 1.0, 40)
+    noise = np.concatenate([stream.next_block().copy() for _ in range(300)])[sample_rate:]
+    assert np.std(noise) == pytest.approx(synthesis.NOISE_RMS, rel=0.15)
+    stream.update(2000, 0.5, 20)
+    assert np.all(np.isfinite(stream.next_block()))
+
+def test_block_stream_is_abstract():
+    with pytest.raises(TypeError):
+        synthesis.BlockStream(44100)
+
+def test_streamed_narrowband_noise_keeps_the_band_level():
+    sample_rate = 44100
+    noise = synthesis.NarrowbandNoise(2000, 100, sample_rate)
+    streamed = np.concatenate([noise.render(np.zeros(1024, dtype=np.float32)).copy() for _ in range(400)])
+    assert np.std(streamed) == pytest.approx(synthesis.NOISE_RMS, rel=0.05)
+    spectrum = np.abs(np.fft.rfft(streamed))
+    freqs = np.fft.rfftfreq(len(streamed), 1 / sample_rate)
+    assert abs(freqs[np.argmax(spectrum)] - 2000) < 150
+
+def test_oscillator_blocks_are_phase_continuous():
+    oscillator = synthesis.Oscillator(1234.5, 44100)
+    blocks = [oscillator.render(np.zeros(size, dtype=np.float32)).copy() for size in (1024, 1000, 1, 4096)]
+    expected = np.sin(2 * np.pi * 1234.5 * np.arange(sum(map(len, blocks))) / 44100)
+    assert np.concatenate(blocks) == pytest.approx(expected, abs=1e-4)
+
+def test_white_noise_is_reproducible_for_a_seed():
+    assert np.array_equal(synthesis.white_noise(10000, seed=3), synthesis.white_noise(10000, seed=3))
+    assert not np.array_equal(synthesis.white_noise(10000, seed=3), synthesis.white_noise(10000, seed=4))
+    assert not np.array_equal(synthesis.white_noise(10000), synthesis.white_noise(10000))
+
+@pytest.mark.parametrize("start, count", [(0, 1000), (12345, 300000), (synthesis.NOISE_BLOCK - 1, 2), (3 * synthesis.NOISE_BLOCK, 5)])
+def test_any_range_of_a_noise_stream_matches_the_whole_stream(start, count):
+    whole = synthesis.white_noise(start + count, seed=7)
+    assert np.array_equal(synthesis.white_noise(count, seed=7, start=start), whole[start:])
+
+def test_noise_stream_reads_do_not_depend_on_their_sizes():
+    stream = synthesis.NoiseStream(5)
+    parts = [stream.read(np.empty(size, dtype=np.float32)) for size in (1, 999, synthesis.NOISE_BLOCK, 70000)]
+    whole = synthesis.white_noise(sum(len(part) for part in parts), seed=5)
+    assert np.array_equal(np.concatenate(parts), whole)
+    assert whole.dtype == np.float32
+    assert abs(np.std(whole) - 1) < 0.01
+
+def test_concurrent_long_noise_renders_are_identical():
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        renders = list(executor.map(lambda _: synthesis.white_noise(10 * synthesis.NOISE_BLOCK, seed=11), range(4)))
+    assert all(np.array_equal(render, renders[0]) for render in renders)
+
+def test_seeded_tone_streams_are_reproducible_across_updates():
+    def render():
+        stream = synthesis.ToneStream([1000, 3000], [100, 50], [0, 40], 44100, seed=3)
+        blocks = [stream.next_block().copy() for _ in range(20)]
+        stream.update([1200, 3000], [100, 50], [0, 80])
+        blocks += [stream.next_block().copy() for _ in range(20)]
+        return np.concatenate(blocks)
+
+    assert np.array_equal(render(), render())
+
+def test_seeded_wav_renders_are_identical(tmp_path):
+    import wave
+    paths = [tmp_path / "a.wav", tmp_path / "b.wav"]
+    for path in paths:
+        synthesis.render_to_wav(str(path), [1000, 4000], [100, 50], [100, 0], 2000, seed=9)
+    with wave.open(str(paths[0])) as wav:
+        assert wav.getnframes() == 88200
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+
+def test_blocks_convert_to_int16_in_place():
+    block = np.array([-2, -1, 0, 0.5, 1, 2], dtype=np.float32)
+    out = np.zeros(6, dtype=np.int16)
+    assert synthesis.to_int16(block, out=out) is out
+    assert out.tolist() == [-32767, -32767, 0, 16383, 32767, 32767]
+    assert synthesis.to_int16(np.array([0.5])).tolist() == [16383]
+
+def test_buffer_sources_reuse_one_padded_last_block():
+    source = synthesis.BufferSource(np.ones(2500, dtype=np.float32), 1024)
+    blocks = [source.next_block() for _ in range(3)]
+    assert blocks[2] is source.padded
+    assert blocks[2][:452].tolist() == [1] * 452 and not blocks[2][452:].any()
+    assert source.next_block() is None